@@ -1,15 +1,16 @@
-import httpx
 import asyncio
 import json
 import os
 from dotenv import load_dotenv
+from http_clients import http_clients
+from metrics import metrics
 
 load_dotenv()
 
 class AIAnalyzer:
     def __init__(self):
         self.api_key = os.getenv("OPENROUTER_API_KEY")
-        self.url = "https://openrouter.ai/api/v1/chat/completions"
+        self.url = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -66,19 +67,19 @@ class AIAnalyzer:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                for attempt in range(3): # Try 3 times
-                    response = await client.post(self.url, headers=self.headers, json=payload, timeout=30.0)
-                    if response.status_code == 200:
-                        result = response.json()
-                        return result['choices'][0]['message']['content']
-                    elif response.status_code == 429:
-                        if attempt < 2:
-                            wait_time = (attempt + 1) * 5
-                            print(f"Rate limit hit. Waiting {wait_time}s...")
-                            await asyncio.sleep(wait_time)
-                            continue
-                    return f"Error AI ({response.status_code}): {response.text}"
+            for attempt in range(3): # Try 3 times
+                with metrics.timed("openrouter"):
+                    response = await http_clients.post("openrouter", self.url, headers=self.headers, json=payload)
+                if response.status_code == 200:
+                    result = response.json()
+                    return result['choices'][0]['message']['content']
+                elif response.status_code == 429:
+                    if attempt < 2:
+                        wait_time = (attempt + 1) * 5
+                        print(f"Rate limit hit. Waiting {wait_time}s...")
+                        await asyncio.sleep(wait_time)
+                        continue
+                return f"Error AI ({response.status_code}): {response.text}"
         except Exception as e:
             return f"Error conectando con AI: {str(e)}"
 
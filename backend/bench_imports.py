@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the entry points (API, daily_scraper CLI, send_followups).
+
+Each entry module is imported in a fresh interpreter several times; the best
+cumulative import time (python -X importtime) is reported next to its baseline
+(import_baseline.json, written with --update). The baseline is scaled by how long a
+stdlib reference import (REFERENCE_MODULE) takes in the same run compared to when it
+was recorded, so a slower or busier machine doesn't read as a regression.
+
+Fails (exit 1) when a heavy dependency that should load lazily (pandas, playwright,
+supabase, ...) is imported at startup. Timing only fails with --fail-on-slowdown: on
+shared CI runners it's too noisy to be a hard gate.
+
+Uso:
+    python bench_imports.py                 # medir y comparar contra el baseline
+    python bench_imports.py --update        # guardar las mediciones actuales como baseline
+    python bench_imports.py --runs 10 --tolerance 0.5 --fail-on-slowdown
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ENTRY_POINTS = ("main", "daily_scraper", "send_followups")
+# Stdlib import measured alongside the entry points to normalize for machine speed
+REFERENCE_MODULE = "asyncio"
+# Only needed by specific code paths; importing them at startup is a regression
+LAZY_MODULES = ("pandas", "playwright", "supabase", "duckdb", "analyzer", "psutil")
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_baseline.json")
+
+
+def best_import_time_ms(module: str, runs: int) -> float:
+    """Best of `runs` cold imports, after one discarded run that warms the OS file cache"""
+    import_time_ms(module)
+    return min(import_time_ms(module) for _ in range(runs))
+
+
+def import_time_ms(module: str) -> float:
+    """Cumulative import time of `module` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    for line in reversed(result.stderr.splitlines()):
+        # "import time: self [us] | cumulative | imported package"
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    raise RuntimeError(f"No importtime line for {module}")
+
+
+def eager_heavy_modules(module: str) -> list:
+    code = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return [m for m in result.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start import benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown over the baseline (0.3 = +30%%)")
+    parser.add_argument("--update", action="store_true", help="write the measurements as the new baseline")
+    parser.add_argument("--fail-on-slowdown", action="store_true", help="also fail when an entry point is over its limit")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    reference = best_import_time_ms(REFERENCE_MODULE, args.runs)
+    measured = {REFERENCE_MODULE: round(reference, 1)}
+    # >1: this machine/run is slower than the one that recorded the baseline
+    scale = reference / baseline[REFERENCE_MODULE] if baseline.get(REFERENCE_MODULE) else 1.0
+    print(f"{REFERENCE_MODULE + ' (ref)':<16} {reference:8.1f} ms  (speed factor vs baseline {scale:.2f})")
+
+    failures = []
+    slowdowns = []
+    for module in ENTRY_POINTS:
+        best = best_import_time_ms(module, args.runs)
+        measured[module] = round(best, 1)
+        eager = eager_heavy_modules(module)
+        line = f"{module:<16} {best:8.1f} ms"
+        if module in baseline:
+            limit = baseline[module] * scale * (1 + args.tolerance)
+            line += f"  (baseline {baseline[module] * scale:.1f} ms scaled, limit {limit:.1f} ms)"
+            if best > limit and not args.update:
+                line += "  SLOW"
+                slowdowns.append(f"{module}: {best:.1f} ms > {limit:.1f} ms")
+        if eager:
+            line += f"  eager: {', '.join(eager)}"
+            failures.append(f"{module}: imports {', '.join(eager)} at startup")
+        print(line)
+
+    if args.update:
+        with open(BASELINE_FILE, "w", encoding="utf-8") as f:
+            json.dump(measured, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {BASELINE_FILE}")
+
+    if slowdowns:
+        if args.fail_on_slowdown:
+            failures += slowdowns
+        else:
+            print("\nSlower than the baseline (not failing; --fail-on-slowdown to enforce):")
+            for slowdown in slowdowns:
+                print(f"  - {slowdown}")
+
+    if failures:
+        print("\nCold start regression:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""
+Offline benchmark: runs GMapsScraper and AutomatedScraper end to end against a local
+fake of Google Maps (results feed + place panels), business websites, OpenRouter,
+Evolution API, n8n and Supabase, with configurable latency per upstream.
+
+Reports leads/min, p50/p95 per-place latency, peak RSS and browsers launched, so every
+performance change can be measured without network access or Google rate limits.
+
+--only pipeline runs just the browser-free part (website fetch, OpenRouter, WhatsApp
+check, outbox + Evolution send, Supabase) against the same fake, so it also works where
+Chromium isn't installed; the scraper benchmarks are skipped with a notice in that case.
+
+Uso:
+    python benchmark.py                                # ambos scrapers, 20 leads
+    python benchmark.py --leads 50 --panel-ms 400 --ai-ms 1500
+    python benchmark.py --only maps --json bench.json
+    python benchmark.py --only pipeline --leads 5      # sin browser
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "be", "du", "fi", "go"]
+LATENCY_MS = {}  # route -> ms, filled from the CLI
+
+
+def business(i: int) -> dict:
+    """Deterministic synthetic business #i (distinct names/coords so dedupe doesn't merge them)"""
+    word = "".join(SYLLABLES[(i // len(SYLLABLES) ** k) % len(SYLLABLES)] for k in range(3)).capitalize()
+    return {
+        "name": f"Estudio {word}",
+        "category": "Spa",
+        "address": f"Calle {word} {100 + i}, Guadalajara",
+        # Cada 7o sin teléfono, cada 3o sin sitio web
+        "phone": "" if i % 7 == 6 else f"+52 33 {10000000 + i:08d}",
+        "website": i % 3 != 2,
+        "lat": 20.60 + i * 0.01,
+        "lng": -103.40 + i * 0.01,
+    }
+
+
+def place_href(i: int) -> str:
+    b = business(i)
+    return (f"/maps/place/{b['name'].replace(' ', '+')}/data=!4m7!3m6!1s0x8428b{i:05x}:0x{i + 4096:x}"
+            f"!8m2!3d{b['lat']:.5f}!4d{b['lng']:.5f}!16s%2Fg%2F11bench{i}")
+
+
+MAPS_PAGE = """<!doctype html><html><body>
+<div role="feed" id="feed" style="width:400px"></div><div id="panel"></div>
+<script>
+const TOTAL = %(total)d, BATCH = 10, HREFS = %(hrefs)s;
+let shown = 0, loading = false;
+function more() {
+  const feed = document.getElementById('feed');
+  for (let n = 0; n < BATCH && shown < TOTAL; n++, shown++) {
+    const idx = shown, a = document.createElement('a');
+    a.href = HREFS[idx]; a.textContent = 'Place ' + idx;
+    a.style.display = 'block'; a.style.height = '60px';
+    a.addEventListener('click', e => { e.preventDefault(); openPanel(idx); });
+    feed.appendChild(a);
+  }
+}
+async function openPanel(idx) {
+  const panel = document.getElementById('panel');
+  panel.innerHTML = '';
+  panel.innerHTML = await (await fetch('/panel/' + idx)).text();
+}
+window.addEventListener('wheel', () => {
+  if (loading) return;
+  loading = true;
+  setTimeout(() => { more(); loading = false; }, %(feed_ms)d);
+});
+more();
+</script></body></html>"""
+
+
+class FakeUpstreams(BaseHTTPRequestHandler):
+    """Maps feed/panels, business sites, OpenRouter, Evolution, n8n and Supabase in one server"""
+
+    total_places = 200
+
+    def _reply(self, status, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _wait(self, route):
+        ms = LATENCY_MS.get(route, 0)
+        if ms:
+            time.sleep(ms / 1000)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path.startswith("/maps/search/"):
+            self._wait("maps")
+            hrefs = json.dumps([place_href(i) for i in range(self.total_places)])
+            page = MAPS_PAGE % {"total": self.total_places, "hrefs": hrefs, "feed_ms": LATENCY_MS.get("feed", 0)}
+            self._reply(200, page, "text/html; charset=utf-8")
+        elif path.startswith("/panel/"):
+            self._wait("panel")
+            i = int(path.rsplit("/", 1)[1])
+            b = business(i)
+            host = self.headers.get("Host")
+            html = f'<h1 class="DUwDvf">{b["name"]}</h1><button class="DkEaL">{b["category"]}</button>' \
+                   f'<button data-item-id="address">{b["address"]}</button>'
+            if b["phone"]:
+                digits = "".join(filter(str.isdigit, b["phone"]))
+                html += f'<button data-item-id="phone:tel:+{digits}">{b["phone"]}</button>'
+            if b["website"]:
+                html += f'<a data-item-id="authority" href="http://{host}/site/{i}">sitio</a>'
+            self._reply(200, html, "text/html; charset=utf-8")
+        elif path.startswith("/site/"):
+            self._wait("site")
+            i = int(path.rsplit("/", 1)[1])
+            body = f"<html><body><h1>{business(i)['name']}</h1>" + "<p>Masajes, faciales y tratamientos.</p>" * 50 + "</body></html>"
+            self._reply(200, body, "text/html; charset=utf-8")
+        else:
+            self._reply(404, "{}")
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        path = urlsplit(self.path).path
+        if path.startswith("/openrouter"):
+            self._wait("ai")
+            self._reply(200, json.dumps({"choices": [{"message": {"content": "¡Hola! Mensaje de benchmark."}}]}))
+        elif path.startswith("/chat/whatsappNumbers/"):
+            self._wait("evolution")
+            # ~80% de los números tienen WhatsApp
+            self._reply(200, json.dumps([{"number": n, "exists": int(n[-4:]) % 5 != 0} for n in body.get("numbers", [])]))
+        elif path.startswith("/message/sendText/"):
+            self._wait("evolution")
+            self._reply(201, json.dumps({"key": {"id": "bench"}}))
+        elif path.startswith("/n8n"):
+            self._wait("n8n")
+            self._reply(200, "{}")
+        elif path.startswith("/rest/v1/"):
+            self._reply(201, "[]")
+        else:
+            self._reply(404, "{}")
+
+    def log_message(self, *args):
+        pass
+
+
+class ResourceSampler:
+    """Polls RSS of this process + its children (Playwright driver, Chromium) and counts browsers"""
+
+    def __init__(self, interval_s=0.25):
+        self.interval_s = interval_s
+        self.peak_rss_mb = 0.0
+        self.peak_browsers = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        me = psutil.Process()
+        while not self._stop.is_set():
+            try:
+                procs = [me] + me.children(recursive=True)
+                rss = 0
+                browsers = 0
+                for proc in procs:
+                    try:
+                        rss += proc.memory_info().rss
+                        cmdline = " ".join(proc.cmdline())
+                        if "chrom" in proc.name().lower() and "--type=" not in cmdline:
+                            browsers += 1
+                    except psutil.Error:
+                        pass
+                self.peak_rss_mb = max(self.peak_rss_mb, rss / 1024 / 1024)
+                self.peak_browsers = max(self.peak_browsers, browsers)
+            except psutil.Error:
+                pass
+            self._stop.wait(self.interval_s)
+
+    def __enter__(self):
+        if HAS_PSUTIL:
+            self._thread = threading.Thread(target=self._sample, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if not HAS_PSUTIL:
+            # Sin psutil: máximo RSS de este proceso y del mayor hijo ya terminado (Linux: KB)
+            self.peak_rss_mb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) / 1024
+            self.peak_browsers = None
+
+
+def configure_env(base_url: str, workdir: str, delay_ms: int):
+    """Point every integration at the fake server and every state file at a temp dir (before imports)"""
+    os.environ.update({
+        "SCRAPER_HEADLESS": "true",
+        "OPENROUTER_API_KEY": "bench",
+        "OPENROUTER_API_URL": f"{base_url}/openrouter",
+        "EVOLUTION_API_URL": base_url,
+        "EVOLUTION_API_KEY": "bench",
+        "N8N_WEBHOOK_URL": f"{base_url}/n8n",
+        "SUPABASE_URL": base_url,
+        "SUPABASE_KEY": "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoiYW5vbiJ9.YmVuY2g",
+        "PLACE_INDEX_FILE": os.path.join(workdir, "place_index.json"),
+        "OUTBOX_FILE": os.path.join(workdir, "outbox.db"),
+        "CHECKPOINT_DIR": os.path.join(workdir, "checkpoints"),
+        "TRACE_DIR": os.path.join(workdir, "traces"),
+        "PROFILES_DIR": os.path.join(workdir, "profiles"),
+        "WAREHOUSE_FILE": os.path.join(workdir, "warehouse.db"),
+        "OUTBOX_BACKOFF_BASE_S": "0.1",
+        "DELAY_MIN_MS": str(delay_ms),
+        "DELAY_MAX_MS": str(delay_ms),
+    })
+
+
+def report(name, leads, elapsed, sampler, metrics) -> dict:
+    result = {
+        "scraper": name,
+        "leads": leads,
+        "seconds": round(elapsed, 2),
+        "leads_per_min": round(leads / elapsed * 60, 2) if elapsed else 0.0,
+        "p50_place_s": round(metrics.percentile("lead_total", 50), 3),
+        "p95_place_s": round(metrics.percentile("lead_total", 95), 3),
+        "peak_rss_mb": round(sampler.peak_rss_mb, 1),
+        "browsers": sampler.peak_browsers,
+        "stages": {stage: round(stats["avg_s"], 3) for stage, stats in metrics.summary().items()},
+    }
+    print(f"\n[BENCH] {name}: {leads} leads en {elapsed:.1f}s -> {result['leads_per_min']} leads/min")
+    print(f"        p50 {result['p50_place_s']}s | p95 {result['p95_place_s']}s por lugar | "
+          f"RSS pico {result['peak_rss_mb']} MB | browsers {result['browsers'] if result['browsers'] is not None else 'n/a'}")
+    print(f"        promedio por etapa: {result['stages']}")
+    return result
+
+
+async def bench_gmaps(base_url, leads, delay_ms):
+    from scraper import GMapsScraper
+    from metrics import metrics
+
+    metrics.reset()
+    scraper = GMapsScraper()
+    events = []
+
+    async def status_callback(event):
+        events.append(event)
+
+    with ResourceSampler() as sampler:
+        start = time.perf_counter()
+        await scraper.scrape("bench-maps", f"{base_url}/maps/search/spa/@20.6,-103.4,14z", "maps", leads,
+                             delay_ms, delay_ms, True, True, status_callback, auto_send_n8n=True)
+        elapsed = time.perf_counter() - start
+    errors = [e for e in events if e["type"] == "error"]
+    if errors:
+        print(f"[BENCH] GMapsScraper error: {errors[0]['message']}")
+    return report("GMapsScraper", len(scraper.jobs["bench-maps"]["leads"]), elapsed, sampler, metrics)
+
+
+async def bench_automated(base_url, leads, workdir):
+    from daily_scraper import AutomatedScraper, LeadTracker
+    from metrics import metrics
+
+    metrics.reset()
+    tracker = LeadTracker(tracking_file=os.path.join(workdir, "contacted_leads.json"))
+    scraper = AutomatedScraper(nicho="spa", tracker=tracker)
+    scraper.max_leads = leads
+
+    with ResourceSampler() as sampler:
+        start = time.perf_counter()
+        await scraper.scrape_url(f"{base_url}/maps/search/spa/@20.6,-103.4,14z")
+        elapsed = time.perf_counter() - start
+    return report("AutomatedScraper", len(scraper.leads), elapsed, sampler, metrics)
+
+
+async def bench_pipeline(base_url, leads, workdir):
+    """The per-lead HTTP work of the scrapers, without the browser, then the outbox send"""
+    from analyzer import AIAnalyzer
+    from daily_scraper import AutomatedScraper, LeadTracker
+    from http_clients import http_clients
+    from metrics import metrics
+    from phones import normalize_phone
+
+    metrics.reset()
+    tracker = LeadTracker(tracking_file=os.path.join(workdir, "contacted_leads.json"))
+    scraper = AutomatedScraper(nicho="spa", tracker=tracker)
+    analyzer = AIAnalyzer()
+    found = []
+
+    with ResourceSampler() as sampler:
+        start = time.perf_counter()
+        i = 0
+        while len(found) < leads and i < FakeUpstreams.total_places:
+            b = business(i)
+            with metrics.lead_timings():
+                with metrics.timed("panel"):
+                    panel = await http_clients.get("websites", f"{base_url}/panel/{i}")
+                phone = normalize_phone(b["phone"])
+                if panel.status_code == 200 and phone and await scraper.check_whatsapp(phone):
+                    site_text = ""
+                    if b["website"]:
+                        with metrics.timed("website"):
+                            site = await http_clients.get("websites", f"{base_url}/site/{i}")
+                        site_text = site.text[:2000]
+                    message = await analyzer.analyze_business(b["name"], b["category"], site_text)
+                    found.append({"name": b["name"], "category": b["category"], "address": b["address"], "phone": phone,
+                                  "ai_analysis": message, "nicho": "spa", "google_maps_url": f"{base_url}{place_href(i)}"})
+            i += 1
+        elapsed = time.perf_counter() - start
+        send_start = time.perf_counter()
+        sent = await scraper.send_all_via_evolution(found)
+        send_elapsed = time.perf_counter() - send_start
+    result = report("Pipeline (sin browser)", len(found), elapsed, sampler, metrics)
+    result.update(places=i, sent=sent, send_seconds=round(send_elapsed, 2))
+    print(f"        {i} lugares | outbox -> Evolution: {'ok' if sent else 'sin envíos'} en {send_elapsed:.1f}s")
+    return result
+
+
+async def chromium_installed() -> bool:
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        return os.path.exists(p.chromium.executable_path)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Offline scraper benchmark")
+    parser.add_argument("--leads", type=int, default=20)
+    parser.add_argument("--places", type=int, default=200, help="places in the fake results feed")
+    parser.add_argument("--only", choices=["maps", "automated", "pipeline"])
+    parser.add_argument("--delay-ms", type=int, default=0, help="scraper click delay (min = max)")
+    parser.add_argument("--maps-ms", type=int, default=300)
+    parser.add_argument("--feed-ms", type=int, default=200, help="time to load more results after a scroll")
+    parser.add_argument("--panel-ms", type=int, default=250)
+    parser.add_argument("--site-ms", type=int, default=300)
+    parser.add_argument("--ai-ms", type=int, default=800)
+    parser.add_argument("--evolution-ms", type=int, default=150)
+    parser.add_argument("--n8n-ms", type=int, default=100)
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    LATENCY_MS.update({"maps": args.maps_ms, "feed": args.feed_ms, "panel": args.panel_ms, "site": args.site_ms,
+                       "ai": args.ai_ms, "evolution": args.evolution_ms, "n8n": args.n8n_ms})
+    FakeUpstreams.total_places = args.places
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeUpstreams)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix="bench_")
+    configure_env(base_url, workdir, args.delay_ms)
+    print(f"[BENCH] Fake upstreams: {base_url} | latencias (ms): {LATENCY_MS} | estado en {workdir}")
+    if not HAS_PSUTIL:
+        print("[BENCH] psutil no instalado: RSS pico aproximado y sin conteo de browsers")
+
+    results = []
+    try:
+        browser = args.only != "pipeline" and await chromium_installed()
+        if args.only != "pipeline" and not browser:
+            print("[BENCH] Chromium no instalado (playwright install chromium): solo se corre el pipeline sin browser")
+        if browser and args.only in (None, "maps"):
+            results.append(await bench_gmaps(base_url, args.leads, args.delay_ms))
+        if browser and args.only in (None, "automated"):
+            results.append(await bench_automated(base_url, args.leads, workdir))
+        if not browser or args.only is None:
+            results.append(await bench_pipeline(base_url, args.leads, workdir))
+    finally:
+        from http_clients import http_clients
+        await http_clients.aclose()
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"latency_ms": LATENCY_MS, "results": results}, f, indent=2)
+        print(f"\n[BENCH] Resultados en {args.json}")
+    return 0 if all(r["leads"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
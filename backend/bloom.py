@@ -0,0 +1,141 @@
+"""
+Memory-mapped Bloom filter used as a fast membership layer in front of the
+authoritative JSON stores (contacted phones, known place IDs).
+
+A negative answer is definitive, so most dedupe checks never touch the JSON.
+The bit array lives in a file next to the store and is mmap'ed, so it opens
+instantly and only the pages actually probed are read into memory. The header
+holds a content hash of the store it was synced with (not its mtime, which a git
+checkout changes), so a filter carried over between runs stays valid.
+"""
+
+import hashlib
+import math
+import mmap
+import os
+import struct
+
+BLOOM_CAPACITY = int(os.getenv("BLOOM_CAPACITY", "1000000"))
+BLOOM_FP_RATE = float(os.getenv("BLOOM_FP_RATE", "0.001"))
+
+_MAGIC = b"BLM2"
+# magic, k, capacity, m_bits, count, source size, source content hash
+_HEADER = struct.Struct("<4sIQQQQq")
+_HEADER_SIZE = 64
+
+
+def _optimal_params(capacity: int, fp_rate: float):
+    m_bits = max(64, int(math.ceil(-capacity * math.log(fp_rate) / (math.log(2) ** 2))))
+    k = max(1, int(round(m_bits / capacity * math.log(2))))
+    return m_bits, k
+
+
+def source_stamp(source_file):
+    """(size, 64-bit content hash) of an authoritative store, to detect a stale derived index"""
+    try:
+        digest = hashlib.blake2b(digest_size=8)
+        size = 0
+        with open(source_file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+                size += len(chunk)
+        return size, int.from_bytes(digest.digest(), "little", signed=True)
+    except OSError:
+        return 0, 0
+
+
+class BloomFilter:
+    def __init__(self, path: str, source_file: str, capacity: int = BLOOM_CAPACITY, fp_rate: float = BLOOM_FP_RATE):
+        self.path = path
+        self.source_file = source_file
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self._file = None
+        self._mmap = None
+        self._open()
+
+    # ------------------------------------------------------------------
+    # File handling
+    # ------------------------------------------------------------------
+    def _open(self):
+        if not os.path.exists(self.path):
+            self._create(self.capacity)
+        self._file = open(self.path, "r+b")
+        self._mmap = mmap.mmap(self._file.fileno(), 0)
+        magic, self.k, self.capacity, self.m_bits, self.count, self._src_size, self._src_hash = \
+            _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC:
+            self.close()
+            os.remove(self.path)
+            self._open()
+
+    def _create(self, capacity):
+        m_bits, k = _optimal_params(capacity, self.fp_rate)
+        with open(self.path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, k, capacity, m_bits, 0, 0, 0).ljust(_HEADER_SIZE, b"\0"))
+            f.truncate(_HEADER_SIZE + (m_bits + 7) // 8)
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.flush()
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def is_stale(self) -> bool:
+        """True if the authoritative store changed since the filter was last synced"""
+        return (self._src_size, self._src_hash) != source_stamp(self.source_file)
+
+    def rebuild(self, keys):
+        """Rebuild from the authoritative keys, growing the filter if history outgrew it"""
+        keys = list(keys)
+        capacity = max(self.capacity, len(keys) * 2)
+        self.close()
+        self.capacity = capacity
+        os.remove(self.path)
+        self._create(capacity)
+        self._open()
+        for key in keys:
+            self.add(key)
+        self.mark_synced()
+        print(f"[BLOOM] Rebuilt {os.path.basename(self.path)} with {len(keys)} keys ({self.m_bits // 8 // 1024} KB)")
+
+    def mark_synced(self):
+        """Record the store's current size/hash so the next open knows the filter is fresh"""
+        self._src_size, self._src_hash = source_stamp(self.source_file)
+        self._write_header()
+
+    def _write_header(self):
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, self.k, self.capacity, self.m_bits, self.count,
+                          self._src_size, self._src_hash)
+
+    # ------------------------------------------------------------------
+    # Membership
+    # ------------------------------------------------------------------
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1, h2 = struct.unpack("<QQ", digest)
+        h2 |= 1
+        m = self.m_bits
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key: str):
+        mm = self._mmap
+        for pos in self._positions(key):
+            byte = _HEADER_SIZE + (pos >> 3)
+            mm[byte] = mm[byte] | (1 << (pos & 7))
+        self.count += 1
+        self._write_header()
+
+    def __contains__(self, key: str) -> bool:
+        mm = self._mmap
+        for pos in self._positions(key):
+            if not mm[_HEADER_SIZE + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    @property
+    def overfull(self) -> bool:
+        return self.count > self.capacity
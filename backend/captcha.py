@@ -0,0 +1,96 @@
+"""
+CAPTCHA handoff for headless scrape jobs.
+
+Jobs run headless; when Google shows a CAPTCHA the job hands that one session to a human:
+- "headed": the context's storage state is opened in a visible browser window, the human
+  solves it there, and the resulting cookies are copied back into the headless context.
+- "remote": the headless page stays put and is exposed through main.py as a screenshot
+  stream plus click/type endpoints (servers without a display). Also the fallback when a
+  headed window can't be opened.
+"""
+
+import asyncio
+import os
+
+CAPTCHA_HANDOFF = os.getenv("CAPTCHA_HANDOFF", "headed")  # "headed" or "remote"
+CAPTCHA_TIMEOUT_S = float(os.getenv("CAPTCHA_TIMEOUT_S", "300"))
+
+# job_id -> headless page waiting for a human through the remote view
+remote_pages = {}
+
+
+async def _wait_until_ready(page, ready_selector: str, timeout_s: float) -> bool:
+    try:
+        await page.wait_for_selector(ready_selector, timeout=timeout_s * 1000)
+        return True
+    except Exception:
+        return False
+
+
+async def _headed_handoff(browser, context, page, ready_selector: str, status_callback) -> bool:
+    url = page.url
+    user_agent = await page.evaluate("navigator.userAgent")
+    state = await context.storage_state()
+    headed = await browser.browser_type.launch(headless=False)
+    try:
+        headed_context = await headed.new_context(storage_state=state, user_agent=user_agent)
+        headed_page = await headed_context.new_page()
+        await headed_page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        await status_callback({"type": "captcha", "state": "open", "remote_view": False,
+                               "message": "⚠️ CAPTCHA detected! Please solve it in the browser window that just opened..."})
+        solved = await _wait_until_ready(headed_page, ready_selector, CAPTCHA_TIMEOUT_S)
+        if solved:
+            # The cookies that passed the CAPTCHA go back to the headless session
+            await context.add_cookies((await headed_context.storage_state())["cookies"])
+            url = headed_page.url
+    finally:
+        await headed.close()
+    if solved:
+        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        solved = await _wait_until_ready(page, ready_selector, 15)
+    return solved
+
+
+async def _remote_handoff(job_id: str, page, ready_selector: str, status_callback) -> bool:
+    remote_pages[job_id] = page
+    try:
+        await status_callback({"type": "captcha", "state": "open", "remote_view": True,
+                               "message": "⚠️ CAPTCHA detected! Solve it in the remote view..."})
+        return await _wait_until_ready(page, ready_selector, CAPTCHA_TIMEOUT_S)
+    finally:
+        remote_pages.pop(job_id, None)
+
+
+async def handoff_captcha(job_id: str, browser, context, page, ready_selector: str, status_callback, headless: bool) -> bool:
+    """
+    Blocks until a human solves the CAPTCHA on `page` (ready_selector shows up again)
+    or CAPTCHA_TIMEOUT_S passes. Returns True if solved; `page` can be used right away.
+    """
+    if not headless:
+        # Headed job (SCRAPER_HEADLESS=false): the window is already in front of the user
+        await status_callback({"type": "captcha", "state": "open", "remote_view": False,
+                               "message": "⚠️ CAPTCHA detected! Please solve it in the browser window now..."})
+        solved = await _wait_until_ready(page, ready_selector, CAPTCHA_TIMEOUT_S)
+    elif CAPTCHA_HANDOFF == "headed":
+        try:
+            solved = await _headed_handoff(browser, context, page, ready_selector, status_callback)
+        except Exception as e:
+            # No display on this machine: fall back to the remote view
+            print(f"[CAPTCHA] Headed handoff unavailable ({e}), using the remote view")
+            solved = await _remote_handoff(job_id, page, ready_selector, status_callback)
+    else:
+        solved = await _remote_handoff(job_id, page, ready_selector, status_callback)
+
+    await status_callback({"type": "captcha", "state": "solved" if solved else "timeout",
+                           "message": "CAPTCHA solved! Resuming..." if solved else "Timeout: CAPTCHA was not solved in time."})
+    return solved
+
+
+async def screenshot_frames(job_id: str, interval_s: float = 1.0):
+    """JPEG frames of the page being solved remotely, until the handoff ends"""
+    while job_id in remote_pages:
+        try:
+            yield await remote_pages[job_id].screenshot(type="jpeg", quality=60)
+        except Exception:
+            pass
+        await asyncio.sleep(interval_s)
@@ -0,0 +1,228 @@
+"""
+Incremental checkpoints for scrape jobs, so a job killed mid-run (API restart,
+GitHub Actions timeout) can resume with only its unfinished work left.
+
+A job is split in sections (one per campaign target, or "main" for API jobs), each holding:
+- processed_ids: canonical place IDs already handled (never reopened on resume)
+- leads: finished leads
+- pending: leads extracted but not yet through the rest of the pipeline (AI, etc.)
+- scroll_steps: how many times the results feed was scrolled
+
+On disk, per job under CHECKPOINT_DIR:
+- <job_id>.json: small header (params, status), rewritten only when the status changes
+- <job_id>.jsonl: append-only journal. save() appends just what changed in the sections
+  since the previous save (new place IDs, new/removed pending leads, new leads, scroll
+  steps), so each lead is written once instead of the whole job on every save.
+The journal is compacted (rewritten from the current state) when a job is loaded to
+resume and when it stops with an error; both files are removed when the job finishes.
+"""
+
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+from leads import json_default
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", "checkpoints")
+# --resume of the daily CLI picks up unfinished runs up to this old (a run killed before midnight included)
+CHECKPOINT_RESUME_MAX_AGE_H = float(os.getenv("CHECKPOINT_RESUME_MAX_AGE_H", "48"))
+
+
+def _checkpoint_dir() -> str:
+    return os.path.join(os.path.dirname(__file__), CHECKPOINT_DIR)
+
+
+def _new_section() -> dict:
+    return {"processed_ids": [], "leads": [], "pending": [], "scroll_steps": 0}
+
+
+class JobCheckpoint:
+    def __init__(self, job_id: str, params: dict = None):
+        self.job_id = job_id
+        self.path = os.path.join(_checkpoint_dir(), f"{job_id}.json")
+        self.journal_path = os.path.join(_checkpoint_dir(), f"{job_id}.jsonl")
+        self.state = {
+            "job_id": job_id,
+            "params": params or {},
+            "status": "running",
+            "sections": {},
+            "updated_at": None,
+        }
+        self._header_saved = False
+        # What the journal already holds, per section (save() appends the difference)
+        self._journaled = {}  # section -> {"processed", "leads", "scroll_steps", "finished", "pending": {id(lead): (lead, key)}}
+        self._next_pending_key = 0
+
+    @classmethod
+    def load(cls, job_id: str):
+        """Returns the saved checkpoint for job_id, or None if there is nothing to resume"""
+        checkpoint = cls(job_id)
+        try:
+            with open(checkpoint.path, "r", encoding="utf-8") as f:
+                header = json.load(f)
+            checkpoint.state.update({k: v for k, v in header.items() if k != "sections"})
+            # Checkpoints from before the journal kept the whole state in the header
+            checkpoint.state["sections"] = header.get("sections", {})
+            checkpoint._replay()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"[CHECKPOINT] Error loading {job_id}: {e}")
+            return None
+        checkpoint._header_saved = "sections" not in header
+        checkpoint._compact()
+        return checkpoint
+
+    @classmethod
+    def latest_run(cls, run_name: str, max_age_h: float = CHECKPOINT_RESUME_MAX_AGE_H):
+        """Most recently updated unfinished checkpoint of a dated run (<run_name>-YYYY-MM-DD), or None"""
+        run_re = re.compile(re.escape(run_name) + r"-\d{4}-\d{2}-\d{2}\.json")
+        candidates = []
+        try:
+            for name in os.listdir(_checkpoint_dir()):
+                if run_re.fullmatch(name):
+                    job_id = name[:-len(".json")]
+                    journal = os.path.join(_checkpoint_dir(), f"{job_id}.jsonl")
+                    updated = os.path.getmtime(journal if os.path.exists(journal) else os.path.join(_checkpoint_dir(), name))
+                    if time.time() - updated <= max_age_h * 3600:
+                        candidates.append((updated, job_id))
+        except FileNotFoundError:
+            return None
+        for _, job_id in sorted(candidates, reverse=True):
+            checkpoint = cls.load(job_id)
+            if checkpoint is not None:
+                return checkpoint
+        return None
+
+    @property
+    def params(self) -> dict:
+        return self.state["params"]
+
+    def section(self, key: str) -> dict:
+        return self.state["sections"].setdefault(key, _new_section())
+
+    # ------------------------------------------------------------------
+    # Journal
+    # ------------------------------------------------------------------
+    def _replay(self):
+        """Rebuild the sections from the journal (a torn last line from a crash is skipped)"""
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return
+        pending = {}  # (section, key) -> lead
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            section = self.section(entry["s"])
+            op = entry["op"]
+            if op == "processed":
+                section["processed_ids"].extend(entry["ids"])
+            elif op == "pending":
+                pending[(entry["s"], entry["k"])] = entry["lead"]
+                section["pending"].append(entry["lead"])
+            elif op == "unpending":
+                lead = pending.pop((entry["s"], entry["k"]), None)
+                if lead is not None:
+                    section["pending"].remove(lead)
+            elif op == "leads":
+                section["leads"].extend(entry["leads"])
+            elif op == "scroll":
+                section["scroll_steps"] = entry["n"]
+            elif op == "finished":
+                section["finished"] = True
+            self.state["updated_at"] = entry.get("t", self.state["updated_at"])
+
+    def _diff(self, key: str, section: dict) -> list:
+        """Journal entries for what changed in a section since the last save"""
+        seen = self._journaled.setdefault(key, {"processed": 0, "leads": 0, "scroll_steps": 0, "finished": False, "pending": {}})
+        entries = []
+        if len(section["processed_ids"]) > seen["processed"]:
+            entries.append({"op": "processed", "ids": section["processed_ids"][seen["processed"]:]})
+            seen["processed"] = len(section["processed_ids"])
+
+        current = {id(lead): lead for lead in section["pending"]}
+        for lead_id in [lead_id for lead_id in seen["pending"] if lead_id not in current]:
+            entries.append({"op": "unpending", "k": seen["pending"].pop(lead_id)[1]})
+        for lead_id, lead in current.items():
+            if lead_id not in seen["pending"]:
+                # The lead is held here too, so its id() can't be reused while it's tracked
+                seen["pending"][lead_id] = (lead, self._next_pending_key)
+                entries.append({"op": "pending", "k": self._next_pending_key, "lead": lead})
+                self._next_pending_key += 1
+
+        if len(section["leads"]) > seen["leads"]:
+            entries.append({"op": "leads", "leads": section["leads"][seen["leads"]:]})
+            seen["leads"] = len(section["leads"])
+        if section["scroll_steps"] != seen["scroll_steps"]:
+            entries.append({"op": "scroll", "n": section["scroll_steps"]})
+            seen["scroll_steps"] = section["scroll_steps"]
+        if section.get("finished") and not seen["finished"]:
+            entries.append({"op": "finished"})
+            seen["finished"] = True
+        return entries
+
+    def _lines(self, now: str) -> list:
+        lines = []
+        for key, section in self.state["sections"].items():
+            for entry in self._diff(key, section):
+                entry.update(s=key, t=now)
+                lines.append(json.dumps(entry, ensure_ascii=False, default=json_default) + "\n")
+        return lines
+
+    def _save_header(self):
+        header = {k: v for k, v in self.state.items() if k != "sections"}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(header, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self._header_saved = True
+
+    def _compact(self):
+        """Rewrite the journal as the minimal set of entries for the current state"""
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._journaled = {}
+            self._next_pending_key = 0
+            tmp_path = self.journal_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.writelines(self._lines(self.state["updated_at"] or datetime.now().isoformat()))
+            os.replace(tmp_path, self.journal_path)
+            if not self._header_saved:
+                self._save_header()
+        except Exception as e:
+            print(f"[CHECKPOINT] Error compacting {self.job_id}: {e}")
+
+    def save(self, status: str = None):
+        now = datetime.now().isoformat()
+        self.state["updated_at"] = now
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if status and status != self.state["status"]:
+                self.state["status"] = status
+                self._save_header()
+            elif not self._header_saved:
+                self._save_header()
+            lines = self._lines(now)
+            if lines:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+        except Exception as e:
+            print(f"[CHECKPOINT] Error saving {self.job_id}: {e}")
+            return
+        if status == "error":
+            # Stopped: leave a compact journal behind for the resume
+            self._compact()
+
+    def finish(self):
+        """The job completed: nothing left to resume"""
+        for path in (self.path, self.journal_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,206 @@
+"""
+Contact recovery from business websites (phone, WhatsApp and email).
+
+Places without a phone on Maps used to be dropped after we had already paid for the
+click, the panel read and the website load. The website tab we already have open is
+read in one evaluation (body text + every link), and scanned with precompiled
+patterns: wa.me / api.whatsapp.com links first (they're WhatsApp by definition), then
+tel: links, then Mexican phone formats in the text, but only right after a phone keyword
+(tel, teléfono, llámanos, WhatsApp, cel...), closest first: order, invoice and folio
+numbers look just like phones. mailto: links and addresses in the text for the email. When the home page has no phone, one "contacto" page of the same
+site is fetched through the pooled HTTP client (no new tab) and scanned the same way;
+under a recorded/replayed session (sessions.py) it's opened in a tab of the browser
+context instead, so the HAR captures and serves it like every other request.
+
+Phones come out normalized with phones.normalize_phone (52XXXXXXXXXX), the same rule
+clean_lead applies, and only 10-digit national numbers are accepted.
+"""
+
+import html
+import os
+import re
+import urllib.parse
+from typing import Optional
+
+from http_clients import http_clients
+from metrics import metrics
+from phones import normalize_phone
+from profiles import USER_AGENTS
+
+# Follow one "contacto" page when the home page has no phone
+CONTACT_FOLLOW_PAGE = os.getenv("CONTACT_FOLLOW_PAGE", "true").lower() == "true"
+# Bytes of a contact page's HTML that are scanned
+CONTACT_PAGE_MAX_BYTES = 300_000
+
+# Body text and every link of the page, in one round trip
+PAGE_CONTACTS_JS = """
+() => ({
+    url: location.href,
+    text: document.body ? document.body.innerText : '',
+    links: Array.from(document.querySelectorAll('a[href]')).map(a => ({href: a.href, text: (a.innerText || '').trim()})),
+})
+"""
+
+# 33 1234 5678, (33) 1234-5678, 331.234.5678, +52 1 55 1234 5678, 3312345678...
+PHONE_RE = re.compile(r"(?<![\d+])(?:\+?\s?52[\s.-]?)?(?:1[\s.-]?)?(?:\(\d{2,3}\)|\d{2,3})[\s.-]?\d{3,4}[\s.-]?\d{4}(?!\d)")
+WHATSAPP_RE = re.compile(r"(?:wa\.me/|api\.whatsapp\.com/send/?\?(?:[^#]*&)?phone=|whatsapp:/?/?send/?\?(?:[^#]*&)?phone=)\+?(\d{10,13})", re.I)
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+# A phone in the text counts only if one of these comes at most PHONE_KEYWORD_WINDOW chars before it
+PHONE_KEYWORD_RE = re.compile(r"tel[eé]fono|\btels?\b|\bll[aá]m|whats\s?app|\bcel|m[oó]vil|phone", re.I)
+PHONE_KEYWORD_WINDOW = 40
+CONTACT_PAGE_RE = re.compile(r"contact|contacto|cont[aá]ctanos|ubicaci[oó]n", re.I)
+# Image names and similar that look like emails (logo@2x.png)
+NOT_EMAIL_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp")
+
+_HREF_RE = re.compile(r"""<a\b[^>]*?href\s*=\s*["']([^"']+)["'][^>]*>(.*?)</a>""", re.I | re.S)
+_SCRIPT_RE = re.compile(r"<(script|style|noscript)\b.*?</\1>", re.I | re.S)
+_TAG_RE = re.compile(r"<[^>]+>")
+
+
+def mx_phone(raw: str) -> Optional[str]:
+    """52XXXXXXXXXX for a Mexican number (with or without 52 / 521), None for anything else"""
+    digits = "".join(filter(str.isdigit, raw or ""))
+    if len(digits) == 13 and digits.startswith("521"):
+        digits = digits[3:]
+    elif len(digits) == 12 and digits.startswith("52"):
+        digits = digits[2:]
+    elif len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    # National numbers are 10 digits and area codes never start with 0 or 1
+    if len(digits) != 10 or digits[0] in "01":
+        return None
+    return normalize_phone(digits)
+
+
+def _keyword_distance(text: str, start: int) -> Optional[int]:
+    """Chars between the closest phone keyword before `start` and `start`, None if none is near"""
+    window = text[max(0, start - PHONE_KEYWORD_WINDOW):start]
+    last = None
+    for last in PHONE_KEYWORD_RE.finditer(window):
+        pass
+    return len(window) - last.end() if last else None
+
+
+def _add(found: list, value):
+    if value and value not in found:
+        found.append(value)
+
+
+def extract_contacts(text: str, links: list) -> dict:
+    """
+    {"phone", "whatsapp", "email"} found in a page (best candidate each, "" if none).
+    links: [{"href", "text"}]. A WhatsApp link wins over tel: links, and those over text
+    matches next to a phone keyword.
+    """
+    whatsapp, tel, text_phones, emails = [], [], [], []
+    for link in links:
+        href = urllib.parse.unquote(link.get("href") or "")
+        match = WHATSAPP_RE.search(href)
+        if match:
+            _add(whatsapp, mx_phone(match.group(1)))
+        elif href.lower().startswith("tel:"):
+            _add(tel, mx_phone(href[4:]))
+        elif href.lower().startswith("mailto:"):
+            _add(emails, href[7:].split("?")[0].strip().lower())
+
+    near_keyword = []
+    for match in PHONE_RE.finditer(text or ""):
+        distance = _keyword_distance(text, match.start())
+        if distance is not None:
+            near_keyword.append((distance, match.group(0)))
+    for _, raw in sorted(near_keyword, key=lambda candidate: candidate[0]):
+        _add(text_phones, mx_phone(raw))
+    for match in EMAIL_RE.finditer(text or ""):
+        email = match.group(0).lower()
+        if not email.endswith(NOT_EMAIL_SUFFIXES):
+            _add(emails, email)
+
+    phones = whatsapp + tel + text_phones
+    return {
+        "phone": phones[0] if phones else "",
+        "whatsapp": whatsapp[0] if whatsapp else "",
+        "email": emails[0] if emails else "",
+    }
+
+
+def _host(url: str) -> str:
+    host = urllib.parse.urlparse(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def contact_page_url(links: list, site_url: str) -> Optional[str]:
+    """First link to a contact page on the same site, if any"""
+    host = _host(site_url)
+    for link in links:
+        href = link.get("href") or ""
+        parsed = urllib.parse.urlparse(href)
+        if parsed.scheme not in ("http", "https") or _host(href) != host:
+            continue
+        if href.rstrip("/") == site_url.rstrip("/"):
+            continue
+        if CONTACT_PAGE_RE.search(parsed.path) or CONTACT_PAGE_RE.search(link.get("text") or ""):
+            return href.split("#")[0]
+    return None
+
+
+def parse_html(body: str, base_url: str):
+    """(text, links) of an HTML page fetched without a browser"""
+    links = [
+        {"href": urllib.parse.urljoin(base_url, html.unescape(href)), "text": html.unescape(_TAG_RE.sub(" ", label)).strip()}
+        for href, label in _HREF_RE.findall(body)
+    ]
+    text = html.unescape(_TAG_RE.sub(" ", _SCRIPT_RE.sub(" ", body)))
+    return text, links
+
+
+async def read_page(page) -> dict:
+    """{"url", "text", "links"} of an open page (the website tab of extract_details)"""
+    try:
+        return await page.evaluate(PAGE_CONTACTS_JS)
+    except Exception:
+        return {"url": "", "text": "", "links": []}
+
+
+async def fetch_contact_page(url: str, context=None) -> dict:
+    """
+    {"text", "links"} of a contact page (empty on failure), over the pooled HTTP client,
+    or in a tab of `context` when given.
+    """
+    if context is not None:
+        page = await context.new_page()
+        try:
+            with metrics.timed("contact_page"):
+                await page.goto(url, wait_until="domcontentloaded", timeout=10000)
+            site = await read_page(page)
+            return {"text": site["text"][:CONTACT_PAGE_MAX_BYTES], "links": site["links"]}
+        except Exception as e:
+            print(f"[CONTACT] Contact page failed ({url}): {e}")
+            return {"text": "", "links": []}
+        finally:
+            await page.close()
+    try:
+        with metrics.timed("contact_page"):
+            response = await http_clients.get("websites", url, follow_redirects=True, headers={"User-Agent": USER_AGENTS[0]})
+        if response.status_code != 200 or "html" not in response.headers.get("content-type", "html"):
+            return {"text": "", "links": []}
+        text, links = parse_html(response.text[:CONTACT_PAGE_MAX_BYTES], str(response.url))
+        return {"text": text, "links": links}
+    except Exception as e:
+        print(f"[CONTACT] Contact page failed ({url}): {e}")
+        return {"text": "", "links": []}
+
+
+async def recover_contacts(site: dict, site_url: str, follow_contact_page: bool = CONTACT_FOLLOW_PAGE, context=None) -> dict:
+    """
+    Contacts of a business from its already loaded home page (`site`, see read_page), plus
+    one contact page when the home page has no phone (see fetch_contact_page for `context`).
+    """
+    contacts = extract_contacts(site.get("text", ""), site.get("links", []))
+    if not contacts["phone"] and follow_contact_page:
+        # The home page may have redirected (http -> https, www...): links are relative to where it landed
+        url = contact_page_url(site.get("links", []), site.get("url") or site_url)
+        if url:
+            page = await fetch_contact_page(url, context)
+            more = extract_contacts(page["text"], page["links"])
+            contacts = {field: contacts[field] or more[field] for field in contacts}
+    return contacts
@@ -0,0 +1,62 @@
+"""
+Per-lead time budget spanning every stage of the pipeline (click, panel wait, panel
+read, website tab, AI), so a single bad place can't stall a job.
+
+A LeadDeadline is started when a place is opened. Each stage runs through `run()`,
+which gives it whatever is left of the budget and cancels it when that runs out; the
+cancellation unwinds through the stage's own try/finally (which closes its tabs), and
+the caller carries on with what the earlier stages gathered, so the lead is emitted
+partial instead of holding up the job. Playwright timeouts inside a stage are clamped
+to the remaining budget with `timeout_ms()`.
+
+Overruns are counted in metrics: lead_budget_overruns (leads cut short) and
+lead_budget_overruns_<stage> (where the budget ran out).
+"""
+
+import asyncio
+import os
+import time
+from typing import Optional
+
+from metrics import metrics
+
+# Seconds one lead may take end to end (the worst case before was ~10 + 14 + 15 + 3x30 s)
+LEAD_BUDGET_S = float(os.getenv("LEAD_BUDGET_S", "45"))
+
+
+class LeadDeadline:
+    def __init__(self, budget_s: float = LEAD_BUDGET_S):
+        self.budget_s = budget_s
+        self.expires_at = time.monotonic() + budget_s
+        self.overrun_stage: Optional[str] = None  # first stage cut short, None while within budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout_ms(self, cap_ms: int) -> int:
+        """A Playwright timeout no longer than `cap_ms` nor than what's left of the budget"""
+        return max(1, min(cap_ms, int(self.remaining() * 1000)))
+
+    async def run(self, stage: str, awaitable, default=None):
+        """Result of `awaitable`, or `default` if the budget runs out first (the stage is cancelled)"""
+        if self.expired:
+            if asyncio.iscoroutine(awaitable):
+                awaitable.close()
+            self._overrun(stage)
+            return default
+        try:
+            return await asyncio.wait_for(awaitable, self.remaining())
+        except asyncio.TimeoutError:
+            self._overrun(stage)
+            return default
+
+    def _overrun(self, stage: str):
+        if self.overrun_stage is None:
+            self.overrun_stage = stage
+            metrics.inc("lead_budget_overruns")
+            print(f"[BUDGET] Lead over its {self.budget_s:g}s budget at {stage}, emitting what was gathered")
+        metrics.inc(f"lead_budget_overruns_{stage}")
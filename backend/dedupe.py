@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Fuzzy business deduplication for CLAVE.AI
+Detecta el mismo negocio aunque aparezca con otro teléfono (fijo vs. celular)
+o con variaciones de nombre/dirección. Un nombre casi idéntico en otra ubicación
+conocida (otra sucursal, o un negocio distinto con nombre genérico) no es duplicado.
+
+Blocking: cada registro solo se compara contra candidatos que comparten
+al menos una llave (teléfono normalizado, geohash, tokens de dirección o
+banda MinHash del nombre), así el costo crece ~linealmente y no cuadrático.
+
+PersistentDeduper guarda los bloques del historial en SQLite junto al archivo de
+tracking: cada consulta carga solo los registros de sus bloques, así la memoria no
+crece con el historial. Lleva el hash del JSON con el que se sincronizó (como los
+filtros Bloom) y se reconstruye solo si el JSON cambió por fuera.
+
+Uso inline: PersistentDeduper.find_match() antes de aceptar un lead.
+Uso batch:  python dedupe.py   (sobre el historial de contacted_leads.json)
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import struct
+import unicodedata
+
+from bloom import source_stamp
+from phones import normalize_phone
+
+NUM_PERM = 32
+BANDS = 8
+ROWS = NUM_PERM // BANDS
+GEOHASH_PRECISION = 6  # ~1.2 km x 0.6 km
+MAX_BLOCK_SIZE = 200  # bloques gigantes (tokens muy comunes) no aportan candidatos útiles
+
+# Umbrales de match
+NAME_ONLY_THRESHOLD = 0.85  # nombre casi idéntico, si la ubicación no lo contradice
+NAME_WITH_LOCATION_THRESHOLD = 0.5  # nombre parecido + misma ubicación
+GEO_CLOSE_METERS = 150
+
+_MERSENNE = (1 << 61) - 1
+_PERMS = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "little") % _MERSENNE | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "little") % _MERSENNE)
+    for i in range(NUM_PERM)
+]
+
+NAME_STOPWORDS = {
+    "de", "del", "la", "el", "los", "las", "y", "en", "sa", "cv", "s", "a", "c", "v",
+    "clinica", "consultorio", "dental", "dentista", "veterinaria", "veterinario", "spa",
+    "gimnasio", "gym", "escuela", "idiomas", "taller", "mecanico", "medico", "dr", "dra",
+}
+ADDRESS_STOPWORDS = {
+    "av", "avenida", "calle", "col", "colonia", "jal", "jalisco", "gdl", "guadalajara",
+    "zapopan", "tlaquepaque", "tonala", "mexico", "mex", "cp", "c", "p", "s", "n", "sn",
+    "de", "del", "la", "el", "los", "las", "y", "local", "int", "ext", "no",
+}
+
+_COORDS_RE = re.compile(r"!3d(-?\d+\.\d+)!4d(-?\d+\.\d+)")
+_AT_COORDS_RE = re.compile(r"@(-?\d+\.\d+),(-?\d+\.\d+)")
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def name_tokens(name: str) -> list:
+    return [t for t in _fold(name).split() if t not in NAME_STOPWORDS]
+
+
+def address_tokens(address: str) -> list:
+    return [t for t in _fold(address).split() if t not in ADDRESS_STOPWORDS]
+
+
+def shingles(name: str) -> set:
+    # Nombres genéricos ("Consultorio Médico") no identifican a nadie: sin shingles
+    text = " ".join(name_tokens(name))
+    if len(text) < 3:
+        return {text} if text else set()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def minhash(shingle_set: set) -> list:
+    if not shingle_set:
+        return []
+    hashes = [struct.unpack("<Q", hashlib.blake2b(s.encode(), digest_size=8).digest())[0] for s in shingle_set]
+    return [min((a * h + b) % _MERSENNE for h in hashes) for a, b in _PERMS]
+
+
+def geohash(lat: float, lng: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    bits, bit_count, even, result = 0, 0, True, []
+    while len(result) < precision:
+        rng, value = (lng_range, lng) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            bits = (bits << 1) | 1
+            rng[0] = mid
+        else:
+            bits <<= 1
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            result.append(_GEOHASH_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(result)
+
+
+def coords_from_maps_url(url: str):
+    for pattern in (_COORDS_RE, _AT_COORDS_RE):
+        match = pattern.search(url or "")
+        if match:
+            return float(match.group(1)), float(match.group(2))
+    return None
+
+
+def _distance_m(a, b) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def make_record(name: str = "", phone: str = "", address: str = "", maps_url: str = "") -> dict:
+    """Representación precomputada de un negocio para el deduper"""
+    name_shingles = shingles(name)
+    return {
+        "name": name,
+        "address": address,
+        "maps_url": maps_url,
+        "phone": normalize_phone(phone) if phone else "",
+        "shingles": name_shingles,
+        "signature": minhash(name_shingles),
+        "address_tokens": set(address_tokens(address)),
+        "coords": coords_from_maps_url(maps_url),
+    }
+
+
+def blocking_keys(record: dict) -> set:
+    keys = set()
+    if record["phone"]:
+        keys.add(f"phone:{record['phone']}")
+    if record["coords"]:
+        keys.add(f"geo:{geohash(*record['coords'])}")
+    tokens = record["address_tokens"]
+    numbers = sorted(t for t in tokens if t.isdigit())
+    words = sorted((t for t in tokens if not t.isdigit()), key=len, reverse=True)
+    if numbers and words:
+        keys.add(f"addr:{numbers[0]}:{words[0]}")
+    signature = record["signature"]
+    for band in range(BANDS if signature else 0):
+        keys.add(f"mh{band}:" + ",".join(str(v) for v in signature[band * ROWS:(band + 1) * ROWS]))
+    return keys
+
+
+def match_score(a: dict, b: dict) -> float:
+    """0..1; >= 1.0 means same phone, otherwise name similarity weighted by location agreement"""
+    if a["phone"] and a["phone"] == b["phone"]:
+        return 1.0
+    name_sim = _jaccard(a["shingles"], b["shingles"])
+    same_place = False
+    # Ubicación conocida de ambos lados (coords o dirección): si no coincide, son lugares distintos
+    known_place = False
+    if a["coords"] and b["coords"]:
+        known_place = True
+        same_place = _distance_m(a["coords"], b["coords"]) <= GEO_CLOSE_METERS
+    if not same_place and a["address_tokens"] and b["address_tokens"]:
+        known_place = True
+        same_place = _jaccard(a["address_tokens"], b["address_tokens"]) >= 0.6
+
+    if name_sim >= NAME_ONLY_THRESHOLD and (same_place or not known_place):
+        return name_sim
+    if same_place and name_sim >= NAME_WITH_LOCATION_THRESHOLD:
+        return min(0.99, name_sim + 0.3)
+    return name_sim * 0.5
+
+
+class BusinessDeduper:
+    def __init__(self):
+        self.records = {}  # record_id -> record
+        self.blocks = {}  # blocking key -> [record_id]
+
+    def __len__(self):
+        return len(self.records)
+
+    def add(self, record_id: str, record: dict):
+        self.records[record_id] = record
+        for key in blocking_keys(record):
+            block = self.blocks.setdefault(key, [])
+            if len(block) < MAX_BLOCK_SIZE:
+                block.append(record_id)
+
+    def find_match(self, record: dict, threshold: float = 0.75):
+        """Retorna (record_id, score) del mejor candidato por encima del umbral, o None"""
+        candidates = set()
+        for key in blocking_keys(record):
+            candidates.update(self.blocks.get(key, ()))
+
+        best = None
+        for candidate_id in candidates:
+            score = match_score(record, self.records[candidate_id])
+            if score >= threshold and (best is None or score > best[1]):
+                best = (candidate_id, score)
+        return best
+
+
+class PersistentDeduper:
+    """
+    Historial de contactados en SQLite (registros + llave de bloque -> registro), al día con
+    `source_file`. Los leads de la corrida que aún no se contactan van a un BusinessDeduper en
+    memoria (add) y solo se persisten al contactarse (store), igual que el JSON.
+    """
+
+    def __init__(self, path: str, source_file: str):
+        self.path = path
+        self.source_file = source_file
+        self.run = BusinessDeduper()  # leads de esta corrida todavía sin contactar
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS records (id TEXT PRIMARY KEY, name TEXT, phone TEXT, address TEXT, maps_url TEXT);
+            CREATE TABLE IF NOT EXISTS blocks (key TEXT, record_id TEXT, UNIQUE (key, record_id));
+        """)
+
+    def is_stale(self) -> bool:
+        """True si el JSON cambió desde la última sincronización (o el índice es nuevo)"""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row is None or row[0] != json.dumps(source_stamp(self.source_file))
+
+    def mark_synced(self):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (json.dumps(source_stamp(self.source_file)),))
+
+    def rebuild(self, leads_data: dict):
+        """Reconstruye el índice desde LeadTracker.leads_data (phone -> datos)"""
+        block_sizes = {}
+        records, blocks = [], []
+        for phone, data in leads_data.items():
+            record = make_record(data.get("lead_name", ""), phone, data.get("address", ""), data.get("google_maps_url", ""))
+            records.append((phone, record["name"], record["phone"], record["address"], record["maps_url"]))
+            for key in blocking_keys(record):
+                if block_sizes.get(key, 0) < MAX_BLOCK_SIZE:
+                    block_sizes[key] = block_sizes.get(key, 0) + 1
+                    blocks.append((key, phone))
+        with self.conn:
+            self.conn.execute("DELETE FROM records")
+            self.conn.execute("DELETE FROM blocks")
+            self.conn.executemany("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)", records)
+            self.conn.executemany("INSERT OR IGNORE INTO blocks VALUES (?, ?)", blocks)
+        self.mark_synced()
+        print(f"[DEDUPE] Índice reconstruido con {len(records)} negocios")
+
+    def add(self, record_id: str, record: dict):
+        """Lead de esta corrida (aún sin contactar): cuenta para el dedupe pero no se persiste"""
+        self.run.add(record_id, record)
+
+    def store(self, record_id: str, record: dict):
+        """Negocio contactado: entra al índice persistente"""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?)",
+                              (record_id, record["name"], record["phone"], record["address"], record["maps_url"]))
+            for key in blocking_keys(record):
+                size = self.conn.execute("SELECT COUNT(*) FROM blocks WHERE key = ?", (key,)).fetchone()[0]
+                if size < MAX_BLOCK_SIZE:
+                    self.conn.execute("INSERT OR IGNORE INTO blocks VALUES (?, ?)", (key, record_id))
+
+    def find_match(self, record: dict, threshold: float = 0.75):
+        """Como BusinessDeduper.find_match, cargando solo los registros de los bloques del lead"""
+        keys = list(blocking_keys(record))
+        best = self.run.find_match(record, threshold)
+        if not keys:
+            return best
+        rows = self.conn.execute(
+            f"SELECT id, name, phone, address, maps_url FROM records WHERE id IN "
+            f"(SELECT record_id FROM blocks WHERE key IN ({','.join('?' * len(keys))}))", keys
+        ).fetchall()
+        for record_id, name, phone, address, maps_url in rows:
+            score = match_score(record, make_record(name, phone, address, maps_url))
+            if score >= threshold and (best is None or score > best[1]):
+                best = (record_id, score)
+        return best
+
+    def close(self):
+        self.conn.close()
+
+
+def deduper_from_tracker_data(leads_data: dict) -> BusinessDeduper:
+    """Siembra un deduper con el historial de LeadTracker.leads_data (phone -> datos)"""
+    deduper = BusinessDeduper()
+    for phone, data in leads_data.items():
+        deduper.add(phone, make_record(
+            name=data.get("lead_name", ""),
+            phone=phone,
+            address=data.get("address", ""),
+            maps_url=data.get("google_maps_url", ""),
+        ))
+    return deduper
+
+
+def dedupe_history(leads_data: dict) -> list:
+    """Batch: agrupa el historial en clusters de negocios duplicados"""
+    deduper = BusinessDeduper()
+    clusters = {}  # record_id raíz -> [record_ids]
+    root_of = {}
+    for phone, data in leads_data.items():
+        record = make_record(data.get("lead_name", ""), phone, data.get("address", ""), data.get("google_maps_url", ""))
+        match = deduper.find_match(record)
+        if match:
+            root = root_of[match[0]]
+            clusters[root].append(phone)
+            root_of[phone] = root
+        else:
+            clusters[phone] = [phone]
+            root_of[phone] = phone
+        deduper.add(phone, record)
+    return [members for members in clusters.values() if len(members) > 1]
+
+
+if __name__ == "__main__":
+    tracking_file = os.path.join(os.path.dirname(__file__), "contacted_leads.json")
+    with open(tracking_file, "r", encoding="utf-8") as f:
+        leads_data = json.load(f).get("leads_data", {})
+
+    clusters = dedupe_history(leads_data)
+    print(f"[DEDUPE] {len(leads_data)} leads en historial | {len(clusters)} negocios duplicados")
+    for members in clusters:
+        names = [leads_data[phone].get("lead_name", "") for phone in members]
+        print(f"  - {' | '.join(f'{n} ({p})' for n, p in zip(names, members))}")
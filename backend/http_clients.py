@@ -0,0 +1,98 @@
+"""
+Shared, pooled HTTP clients for every outbound integration (OpenRouter, n8n, Evolution, Instagram,
+business websites for contact recovery).
+One long-lived httpx.AsyncClient per upstream keeps TCP/TLS connections alive between
+requests instead of paying the handshake on every call.
+"""
+
+import asyncio
+import time
+
+import httpx
+
+from tracing import span
+
+try:
+    import h2  # noqa: F401
+    HAS_HTTP2 = True
+except ImportError:
+    HAS_HTTP2 = False
+
+# Per-upstream pool limits and timeouts
+UPSTREAMS = {
+    "openrouter": {"timeout": 30.0, "max_connections": 10, "max_keepalive": 5, "http2": True},
+    "n8n": {"timeout": 10.0, "max_connections": 5, "max_keepalive": 2, "http2": False},
+    "evolution": {"timeout": 30.0, "max_connections": 5, "max_keepalive": 2, "http2": False},
+    "instagram": {"timeout": 15.0, "max_connections": 4, "max_keepalive": 4, "http2": True},
+    # Contact pages of scraped businesses (a different host each time: short timeout, few keepalives)
+    "websites": {"timeout": 10.0, "max_connections": 10, "max_keepalive": 2, "http2": False},
+}
+DEFAULT_UPSTREAM = {"timeout": 15.0, "max_connections": 10, "max_keepalive": 5, "http2": False}
+
+
+class HttpClients:
+    def __init__(self):
+        self._clients = {}  # upstream -> (event loop, client)
+        self.stats = {}
+
+    def client(self, upstream: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(upstream)
+        # httpx clients are bound to the loop they were first used on (asyncio.run creates a new one)
+        if entry is None or entry[0] is not loop or entry[1].is_closed:
+            config = UPSTREAMS.get(upstream, DEFAULT_UPSTREAM)
+            client = httpx.AsyncClient(
+                timeout=config["timeout"],
+                limits=httpx.Limits(
+                    max_connections=config["max_connections"],
+                    max_keepalive_connections=config["max_keepalive"],
+                    keepalive_expiry=60.0,
+                ),
+                http2=config["http2"] and HAS_HTTP2,
+            )
+            self._clients[upstream] = (loop, client)
+        return self._clients[upstream][1]
+
+    def _record(self, upstream, elapsed, error):
+        stats = self.stats.setdefault(upstream, {"requests": 0, "errors": 0, "latency_total_s": 0.0, "latency_max_s": 0.0})
+        stats["requests"] += 1
+        stats["latency_total_s"] += elapsed
+        stats["latency_max_s"] = max(stats["latency_max_s"], elapsed)
+        if error:
+            stats["errors"] += 1
+
+    async def request(self, upstream: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            with span(f"http:{upstream}", method=method):
+                response = await self.client(upstream).request(method, url, **kwargs)
+        except Exception:
+            self._record(upstream, time.perf_counter() - start, error=True)
+            raise
+        self._record(upstream, time.perf_counter() - start, error=response.status_code >= 500 or response.status_code == 429)
+        return response
+
+    async def get(self, upstream: str, url: str, **kwargs) -> httpx.Response:
+        return await self.request(upstream, "GET", url, **kwargs)
+
+    async def post(self, upstream: str, url: str, **kwargs) -> httpx.Response:
+        return await self.request(upstream, "POST", url, **kwargs)
+
+    def get_stats(self) -> dict:
+        return {
+            upstream: {
+                **stats,
+                "latency_avg_s": stats["latency_total_s"] / stats["requests"] if stats["requests"] else 0.0,
+            }
+            for upstream, stats in self.stats.items()
+        }
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        for upstream, (client_loop, client) in list(self._clients.items()):
+            if client_loop is loop:
+                await client.aclose()
+            del self._clients[upstream]
+
+
+http_clients = HttpClients()
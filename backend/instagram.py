@@ -0,0 +1,288 @@
+"""
+Instagram profile harvesting from Google results (site:instagram.com <query>).
+
+Each results page is read in a single in-page evaluation (every Instagram link plus
+its result title), usernames are deduped across pages, and the next pages are built
+from the `start=` offset so a few of them load concurrently instead of clicking
+"Next" one page at a time. The harvest ends on a page without profile links or without
+a "Next" link, or after a few batches in a row that brought no new username.
+
+Harvested usernames are then enriched with their public profile metadata (bio, external
+link, business category, contact phone/email) through a bounded-concurrency fetcher with
+a per-username TTL cache, so the leads can go through the AI/delivery pipeline.
+"""
+
+import asyncio
+import json
+import math
+import os
+import re
+import time
+import urllib.parse
+from typing import Optional
+
+from http_clients import http_clients
+from metrics import metrics
+from pacing import pacing
+
+RESULTS_PER_PAGE = 10
+# Result pages loaded at once (tabs of the same context)
+INSTAGRAM_PARALLEL_PAGES = int(os.getenv("INSTAGRAM_PARALLEL_PAGES", "3"))
+# Batches in a row without a new username before the harvest is considered exhausted
+INSTAGRAM_MAX_STALE_BATCHES = int(os.getenv("INSTAGRAM_MAX_STALE_BATCHES", "2"))
+RESULT_SELECTOR = 'div.g, div.tF2Cxc, div.MjjYud, div.sr_item, div.SearchCard'
+# instagram.com/<first path segment> values that aren't profiles
+NON_PROFILE_PATHS = {"p", "reel", "reels", "explore", "stories", "accounts", "tv", "directory", "about", "legal", "developer"}
+USERNAME_RE = re.compile(r"instagram\.com/([A-Za-z0-9_.]+)")
+
+INSTAGRAM_API_URL = os.getenv("INSTAGRAM_API_URL", "https://www.instagram.com/api/v1/users/web_profile_info/")
+# App ID the instagram.com web client sends; the endpoint rejects requests without it
+INSTAGRAM_APP_ID = os.getenv("INSTAGRAM_APP_ID", "936619743392459")
+INSTAGRAM_CACHE_FILE = os.getenv("INSTAGRAM_CACHE_FILE", "instagram_cache.json")
+INSTAGRAM_CACHE_TTL_H = float(os.getenv("INSTAGRAM_CACHE_TTL_H", "72"))
+INSTAGRAM_ENRICH_CONCURRENCY = int(os.getenv("INSTAGRAM_ENRICH_CONCURRENCY", "4"))
+
+# Every Instagram link on the page with the title of the result it belongs to, and
+# whether Google offers a next page
+HARVEST_JS = """
+(selector) => ({
+    links: Array.from(document.querySelectorAll('a[href*="instagram.com"]')).map(a => {
+        const result = a.closest(selector);
+        const h3 = (result || a).querySelector('h3');
+        return {href: a.href, title: ((h3 ? h3.innerText : a.innerText) || '').trim()};
+    }),
+    has_next: !!document.querySelector('a#pnnext'),
+})
+"""
+
+
+def serp_url(query: str, start: int = 0) -> str:
+    search_query = urllib.parse.quote(f"site:instagram.com {query}")
+    return f"https://www.google.com/search?q={search_query}&start={start}"
+
+
+def profile_username(href: str) -> Optional[str]:
+    """Username of an Instagram profile link, None for posts, reels and other pages"""
+    match = USERNAME_RE.search(urllib.parse.unquote(href or ""))
+    if not match or match.group(1).lower() in NON_PROFILE_PATHS:
+        return None
+    return match.group(1)
+
+
+async def harvest_links(page) -> dict:
+    """
+    {"profiles": [{"username", "title"}], "has_next"} of a results page, in one round trip.
+    Only profile links count: Google's own links (tabs, related searches, pagination)
+    also carry "site:instagram.com" in their query.
+    """
+    try:
+        harvest = await page.evaluate(HARVEST_JS, RESULT_SELECTOR)
+    except Exception:
+        return {"profiles": [], "has_next": False}
+    profiles = []
+    for link in harvest["links"]:
+        username = profile_username(link["href"])
+        if username:
+            profiles.append({"username": username, "title": link["title"]})
+    return {"profiles": profiles, "has_next": harvest["has_next"]}
+
+
+async def is_blocked(page) -> bool:
+    if await pacing.detect_captcha(page, "google_serp"):
+        return True
+    try:
+        return "detecting unusual traffic" in (await page.content()).lower()
+    except Exception:
+        return False
+
+
+class InstagramHarvester:
+    def __init__(self, context, query: str, seen=(), parallel_pages: int = INSTAGRAM_PARALLEL_PAGES):
+        self.context = context
+        self.query = query
+        # Usernames already emitted (resume); a set passed in is kept, so sub-jobs of a batch share it
+        self.seen = seen if isinstance(seen, set) else set(seen)
+        self.parallel_pages = max(1, parallel_pages)
+        self.next_start = 0
+        self.exhausted = False  # Google ran out of results
+        self.stale_batches = 0  # batches in a row that brought no new username
+        self.blocked = False  # CAPTCHA that wasn't solved
+
+    @property
+    def done(self) -> bool:
+        return self.exhausted or self.blocked
+
+    async def _open(self, start: int):
+        page = await self.context.new_page()
+        try:
+            await page.goto(serp_url(self.query, start), wait_until="domcontentloaded", timeout=60000)
+            return page, await harvest_links(page)
+        except Exception as e:
+            print(f"[INSTAGRAM] Results page start={start} failed: {e}")
+            return page, {"profiles": [], "has_next": False}
+
+    async def next_batch(self, wanted: int, on_captcha) -> list:
+        """
+        New profiles ({"username", "url", "title"}) from the next few result pages, loaded
+        concurrently (enough pages for `wanted` profiles, at most parallel_pages).
+        on_captcha(page) -> bool is awaited for a blocked page; False stops the harvest.
+        """
+        if self.done:
+            return []
+        n_pages = min(self.parallel_pages, max(1, math.ceil(wanted / RESULTS_PER_PAGE)))
+        starts = [self.next_start + i * RESULTS_PER_PAGE for i in range(n_pages)]
+        self.next_start = starts[-1] + RESULTS_PER_PAGE
+
+        with metrics.timed("navigate"):
+            opened = await asyncio.gather(*(self._open(start) for start in starts))
+
+        found = []
+        try:
+            # Pages in order: a blocked page, one without profiles or the last one ends the batch
+            for page, harvest in opened:
+                if not harvest["profiles"] and await is_blocked(page):
+                    if not await on_captcha(page):
+                        self.blocked = True
+                        break
+                    harvest = await harvest_links(page)
+                if not harvest["profiles"]:
+                    self.exhausted = True
+                    break
+                for profile in harvest["profiles"]:
+                    username = profile["username"]
+                    if username.lower() in self.seen:
+                        continue
+                    self.seen.add(username.lower())
+                    found.append({"username": username, "url": f"https://www.instagram.com/{username}/", "title": profile["title"]})
+                if not harvest["has_next"]:
+                    self.exhausted = True
+                    break
+        finally:
+            for page, _ in opened:
+                await page.close()
+
+        # Google keeps paginating results we already have (or another sub-job emitted)
+        self.stale_batches = 0 if found else self.stale_batches + 1
+        if self.stale_batches >= INSTAGRAM_MAX_STALE_BATCHES:
+            self.exhausted = True
+
+        if not self.done:
+            await asyncio.sleep(pacing.delay("google_serp", 1.5, 2.5))
+        return found
+
+
+class ProfileEnricher:
+    """Public metadata of Instagram profiles, cached per username for INSTAGRAM_CACHE_TTL_H"""
+
+    def __init__(self, cache_file=INSTAGRAM_CACHE_FILE, concurrency: int = INSTAGRAM_ENRICH_CONCURRENCY):
+        self.cache_file = os.path.join(os.path.dirname(__file__), cache_file)
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._dirty = False
+        self.cache = {}  # username -> {"fetched_at": epoch, "profile": dict or None (no such profile)}
+        try:
+            if os.path.exists(self.cache_file):
+                with open(self.cache_file, "r", encoding="utf-8") as f:
+                    self.cache = json.load(f)
+        except Exception as e:
+            print(f"[INSTAGRAM] Error loading profile cache: {e}")
+
+    def _cached(self, username: str):
+        entry = self.cache.get(username.lower())
+        if entry and time.time() - entry["fetched_at"] < INSTAGRAM_CACHE_TTL_H * 3600:
+            return entry
+        return None
+
+    async def fetch(self, username: str) -> Optional[dict]:
+        """Profile metadata for `username`; None if it doesn't exist or couldn't be fetched"""
+        cached = self._cached(username)
+        if cached is not None:
+            metrics.inc("instagram_cache_hits")
+            return cached["profile"]
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                with metrics.timed("instagram_profile"):
+                    response = await http_clients.get(
+                        "instagram", INSTAGRAM_API_URL, params={"username": username},
+                        headers={"X-IG-App-ID": INSTAGRAM_APP_ID, "Accept": "application/json"},
+                    )
+            except Exception as e:
+                print(f"[INSTAGRAM] Profile fetch failed for @{username}: {e}")
+                return None
+
+        if response.status_code == 429:
+            pacing.stress("instagram", "http_429")
+            return None
+        if response.status_code == 404:
+            profile = None
+        elif response.status_code == 200:
+            pacing.success("instagram")
+            try:
+                profile = parse_profile(response.json())
+            except Exception as e:
+                print(f"[INSTAGRAM] Unexpected profile payload for @{username}: {e}")
+                return None
+        else:
+            # Login wall, 5xx...: not cached, retried next time
+            return None
+
+        self.cache[username.lower()] = {"fetched_at": time.time(), "profile": profile}
+        self._dirty = True
+        return profile
+
+    async def fetch_many(self, usernames) -> list:
+        return await asyncio.gather(*(self.fetch(u) for u in usernames))
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            # Expired entries are dropped on save
+            now = time.time()
+            self.cache = {u: e for u, e in self.cache.items() if now - e["fetched_at"] < INSTAGRAM_CACHE_TTL_H * 3600}
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f, ensure_ascii=False)
+            self._dirty = False
+        except Exception as e:
+            print(f"[INSTAGRAM] Error saving profile cache: {e}")
+
+
+def parse_profile(payload: dict) -> Optional[dict]:
+    """The fields we use from a web_profile_info response"""
+    user = (payload.get("data") or {}).get("user")
+    if not user:
+        return None
+    phone = user.get("business_phone_number") or user.get("public_phone_number") or ""
+    country_code = user.get("public_phone_country_code") or ""
+    if phone and country_code and not phone.startswith("+"):
+        phone = f"+{country_code} {phone}"
+    return {
+        "full_name": user.get("full_name") or "",
+        "biography": user.get("biography") or "",
+        "external_url": user.get("external_url") or "",
+        "category": user.get("business_category_name") or user.get("category_name") or "",
+        "phone": phone,
+        "email": user.get("business_email") or user.get("public_email") or "",
+        "followers": (user.get("edge_followed_by") or {}).get("count", 0),
+        "is_business": bool(user.get("is_business_account")),
+    }
+
+
+def profile_snippet(username: str, profile: dict) -> str:
+    """Text about the profile handed to the AI analyzer (in place of website text)"""
+    parts = [f"Instagram Profile: @{username}"]
+    if profile.get("category"):
+        parts.append(f"Categoría: {profile['category']}")
+    if profile.get("followers"):
+        parts.append(f"Seguidores: {profile['followers']}")
+    if profile.get("biography"):
+        parts.append(f"Bio: {profile['biography']}")
+    if profile.get("external_url"):
+        parts.append(f"Link en bio: {profile['external_url']}")
+    return "\n".join(parts)
+
+
+instagram_enricher = ProfileEnricher()
@@ -0,0 +1,172 @@
+"""
+Compact lead record for the scrape pipeline.
+
+A Lead keeps its short fields (name, phone, ...) in __slots__ instead of a per-lead
+dict, and its large texts (website snippet, AI message, follow-up message) deduplicated
+through the TextStore of its job: each distinct text is kept once and every lead that
+has it points to the same object, so templated messages and repeated chain websites
+cost nothing per extra lead. Optionally (LEAD_TEXT_COMPRESS_MIN > 0) long texts are
+kept zlib-compressed, trading serialization time for memory. Leads still behave as
+mappings (lead["name"], lead.get, dict(lead)), so the rest of the pipeline handles them
+like the dicts they replace.
+
+dumps() serializes events/leads with orjson when it's installed, else json.
+"""
+
+import copy
+import hashlib
+import json
+import os
+import zlib
+from collections.abc import MutableMapping
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Texts at least this long are zlib-compressed (0 = never: decompressing slows down every serialization)
+LEAD_TEXT_COMPRESS_MIN = int(os.getenv("LEAD_TEXT_COMPRESS_MIN", "0"))
+
+FIELDS = ("name", "category", "address", "phone", "website", "rating", "reviews_count", "google_maps_url")
+TEXT_FIELDS = ("website_snippet", "ai_analysis", "followup_message")
+_UNSET = object()
+
+
+class TextStore:
+    """
+    Deduplicated (optionally compressed) lead texts of one job. Leads hold the shared
+    objects themselves, so the store and its texts are freed together with the job's leads.
+    """
+
+    def __init__(self, compress_min: int = LEAD_TEXT_COMPRESS_MIN):
+        self.compress_min = compress_min
+        self._texts = {}  # text -> the shared str; blake2b digest -> zlib bytes for compressed texts
+
+    def put(self, text: str):
+        """The shared copy of `text`: a str, or zlib bytes when it's long enough to compress"""
+        if not self.compress_min or len(text) < self.compress_min:
+            return self._texts.setdefault(text, text)
+        encoded = text.encode("utf-8")
+        digest = hashlib.blake2b(encoded, digest_size=8).digest()
+        packed = self._texts.get(digest)
+        if packed is None:
+            packed = self._texts[digest] = zlib.compress(encoded, 6)
+        return packed
+
+    def get_stats(self) -> dict:
+        return {
+            "texts": len(self._texts),
+            "stored_bytes": sum(len(v) if isinstance(v, bytes) else len(v.encode("utf-8")) for v in self._texts.values()),
+        }
+
+
+def _unpack(value):
+    return zlib.decompress(value).decode("utf-8") if type(value) is bytes else value
+
+
+class Lead(MutableMapping):
+    __slots__ = FIELDS + tuple(f"_{field}" for field in TEXT_FIELDS) + ("_extra", "_store")
+
+    def __init__(self, data=(), store: TextStore = None, **fields):
+        for field in FIELDS:
+            setattr(self, field, _UNSET)
+        for field in TEXT_FIELDS:
+            setattr(self, f"_{field}", _UNSET)
+        self._extra = None  # any other key (nicho, email, ...)
+        # Scrapers pass their job's store; a lone Lead gets a private one
+        self._store = store if store is not None else TextStore()
+        self.update(data, **fields)
+
+    def __getitem__(self, key):
+        if key in FIELDS:
+            value = getattr(self, key)
+        elif key in TEXT_FIELDS:
+            value = _unpack(getattr(self, f"_{key}"))
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+        else:
+            raise KeyError(key)
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in FIELDS:
+            setattr(self, key, value)
+        elif key in TEXT_FIELDS:
+            # Empty/non-string values are kept as they are
+            setattr(self, f"_{key}", self._store.put(value) if isinstance(value, str) and value else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        self[key]  # KeyError if unset
+        if key in FIELDS:
+            setattr(self, key, _UNSET)
+        elif key in TEXT_FIELDS:
+            setattr(self, f"_{key}", _UNSET)
+        else:
+            del self._extra[key]
+
+    def __iter__(self):
+        for field in FIELDS:
+            if getattr(self, field) is not _UNSET:
+                yield field
+        for field in TEXT_FIELDS:
+            if getattr(self, f"_{field}") is not _UNSET:
+                yield field
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"Lead({self.to_dict()!r})"
+
+    # copy/deepcopy/pickle go through the plain fields (the _UNSET sentinel can't be copied)
+    def __reduce__(self):
+        return Lead, (self.to_dict(),)
+
+    def __copy__(self):
+        return Lead(self.to_dict(), store=self._store)
+
+    def __deepcopy__(self, memo):
+        # Texts are immutable: the copy can share them (and the store) with the original
+        data = self.to_dict()
+        if self._extra:
+            data.update(copy.deepcopy(self._extra, memo))
+        return Lead(data, store=self._store)
+
+    def to_dict(self) -> dict:
+        # Straight over the slots (the generic Mapping iteration is several times slower)
+        data = {}
+        for field in FIELDS:
+            value = getattr(self, field)
+            if value is not _UNSET:
+                data[field] = value
+        for field in TEXT_FIELDS:
+            value = getattr(self, f"_{field}")
+            if value is not _UNSET:
+                data[field] = _unpack(value)
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+
+def json_default(obj):
+    """`default=` for json/orjson dumps of structures holding Leads"""
+    if isinstance(obj, Lead):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> str:
+    """JSON for SSE events, exports and checkpoints (Lead-aware)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, default=json_default).decode("utf-8")
+    return json.dumps(obj, default=json_default, ensure_ascii=False)
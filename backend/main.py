@@ -1,13 +1,24 @@
-from fastapi import FastAPI, BackgroundTasks, Request
+from fastapi import FastAPI, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
+from typing import List, Optional
 import uuid
 import asyncio
-import json
+import gzip
 import os
-import pandas as pd
-from scraper import scraper_instance
+from scraper import scraper_instance, BATCH_CONCURRENCY
+from http_clients import http_clients
+from checkpoint import JobCheckpoint
+from metrics import metrics
+from tracing import trace_path
+from sessions import ScrapeSession
+from pacing import pacing
+from captcha import remote_pages, screenshot_frames
+from profiles import profile_manager
+from results import result_store, DEFAULT_PAGE_SIZE
+from warehouse import warehouse, AGGREGATES
+from leads import dumps
 from sse_starlette.sse import EventSourceResponse
 
 app = FastAPI()
@@ -29,12 +40,74 @@ class ScrapeRequest(BaseModel):
     extract_website: bool = True
     extract_phone: bool = True
     auto_send_n8n: bool = False
+    skip_known_places: bool = False # skip places already opened by earlier jobs
+    trace: bool = False # record a Chrome trace of the job (GET /scrape/trace/{job_id})
+    session_mode: str = "live" # "live", "record" or "replay" (HAR capture/playback, see sessions.py)
+    session_name: Optional[str] = None
+
+class BatchScrapeRequest(BaseModel):
+    urls: List[str] # queries/URLs, one sub-job each
+    mode: str = "maps"
+    max_leads: int = 200 # global across all sub-jobs
+    delay_min_ms: int = 1000
+    delay_max_ms: int = 3000
+    extract_website: bool = True
+    extract_phone: bool = True
+    auto_send_n8n: bool = False
+    skip_known_places: bool = False
+    concurrency: int = BATCH_CONCURRENCY # sub-jobs running at once on the shared browser
+
+# Keep a pool of warmed browser profiles (cookies/consent) ready for jobs. Started by the
+# first /scrape/* request, not at boot: it launches Chromium, which a cold start shouldn't pay
+PROFILE_REFRESH = os.getenv("PROFILE_REFRESH", "true").lower() == "true"
+
+def start_profile_refresh():
+    if PROFILE_REFRESH:
+        profile_manager.start_background_refresh()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    await profile_manager.stop_background_refresh()
+    await warehouse.close()
+    await http_clients.aclose()
+
+@app.get("/upstreams/stats")
+async def upstream_stats():
+    return http_clients.get_stats()
+
+@app.get("/pacing/stats")
+async def pacing_stats():
+    return pacing.get_stats()
+
+@app.get("/profiles/stats")
+async def profile_stats():
+    return profile_manager.get_stats()
+
+@app.get("/analytics")
+async def list_analytics():
+    return {name: description for name, (description, _) in AGGREGATES.items()}
+
+@app.get("/analytics/{name}")
+async def get_analytics(name: str, days: int = 90):
+    if name not in AGGREGATES:
+        return JSONResponse(status_code=404, content={"message": f"Unknown aggregate (one of {', '.join(AGGREGATES)})"})
+    return {"aggregate": name, "days": days, "rows": await warehouse.aggregate(name, days)}
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render_prometheus(http_clients.get_stats()), media_type="text/plain; version=0.0.4")
 
 # Store progress events for SSE
 job_events = {}
 
 @app.post("/scrape/start")
 async def start_scrape(request: ScrapeRequest, background_tasks: BackgroundTasks):
+    try:
+        session = ScrapeSession(request.session_name, request.session_mode)
+    except (ValueError, FileNotFoundError) as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+    start_profile_refresh()
+
     job_id = str(uuid.uuid4())
     job_events[job_id] = asyncio.Queue()
     
@@ -52,11 +125,98 @@ async def start_scrape(request: ScrapeRequest, background_tasks: BackgroundTasks
         request.extract_website,
         request.extract_phone,
         status_callback,
-        request.auto_send_n8n
+        request.auto_send_n8n,
+        request.skip_known_places,
+        trace=request.trace,
+        session=session
     )
     
     return {"job_id": job_id}
 
+@app.post("/scrape/batch")
+async def start_batch(request: BatchScrapeRequest, background_tasks: BackgroundTasks):
+    if not request.urls:
+        return JSONResponse(status_code=400, content={"message": "urls must not be empty"})
+    start_profile_refresh()
+
+    batch_id = str(uuid.uuid4())
+    job_events[batch_id] = asyncio.Queue()
+
+    # One aggregated stream: sub-job events arrive tagged with their sub_job_id
+    async def status_callback(event_data):
+        await job_events[batch_id].put(event_data)
+
+    background_tasks.add_task(
+        scraper_instance.scrape_batch,
+        batch_id,
+        request.urls,
+        request.mode,
+        request.max_leads,
+        request.delay_min_ms,
+        request.delay_max_ms,
+        request.extract_website,
+        request.extract_phone,
+        status_callback,
+        request.auto_send_n8n,
+        request.skip_known_places,
+        request.concurrency
+    )
+
+    # Each sub-job's leads are also at /scrape/result/{sub_job_id}
+    return {"job_id": batch_id, "sub_jobs": [f"{batch_id}-{i}" for i in range(len(request.urls))]}
+
+@app.post("/scrape/resume/{job_id}")
+async def resume_scrape(job_id: str, background_tasks: BackgroundTasks):
+    if JobCheckpoint.load(job_id) is None:
+        return JSONResponse(status_code=404, content={"message": "No checkpoint for this job"})
+    start_profile_refresh()
+    job_events[job_id] = asyncio.Queue()
+
+    async def status_callback(event_data):
+        await job_events[job_id].put(event_data)
+
+    background_tasks.add_task(scraper_instance.resume, job_id, status_callback)
+    return {"job_id": job_id}
+
+class CaptchaClick(BaseModel):
+    x: float
+    y: float
+
+class CaptchaText(BaseModel):
+    text: str
+
+# Remote view of a headless job waiting on a CAPTCHA (see captcha.py)
+@app.get("/scrape/captcha/{job_id}/screenshot")
+async def captcha_screenshot(job_id: str):
+    if job_id not in remote_pages:
+        return JSONResponse(status_code=404, content={"message": "No CAPTCHA waiting for this job"})
+    return Response(await remote_pages[job_id].screenshot(type="jpeg", quality=60), media_type="image/jpeg")
+
+@app.get("/scrape/captcha/{job_id}/stream")
+async def captcha_stream(job_id: str):
+    if job_id not in remote_pages:
+        return JSONResponse(status_code=404, content={"message": "No CAPTCHA waiting for this job"})
+
+    async def mjpeg():
+        async for frame in screenshot_frames(job_id):
+            yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
+
+    return StreamingResponse(mjpeg(), media_type="multipart/x-mixed-replace; boundary=frame")
+
+@app.post("/scrape/captcha/{job_id}/click")
+async def captcha_click(job_id: str, click: CaptchaClick):
+    if job_id not in remote_pages:
+        return JSONResponse(status_code=404, content={"message": "No CAPTCHA waiting for this job"})
+    await remote_pages[job_id].mouse.click(click.x, click.y)
+    return {"ok": True}
+
+@app.post("/scrape/captcha/{job_id}/type")
+async def captcha_type(job_id: str, text: CaptchaText):
+    if job_id not in remote_pages:
+        return JSONResponse(status_code=404, content={"message": "No CAPTCHA waiting for this job"})
+    await remote_pages[job_id].keyboard.type(text.text)
+    return {"ok": True}
+
 @app.get("/scrape/stream/{job_id}")
 async def stream_scrape(job_id: str):
     if job_id not in job_events:
@@ -67,26 +227,77 @@ async def stream_scrape(job_id: str):
         while True:
             event = await queue.get()
             yield {
-                "data": json.dumps(event)
+                "data": dumps(event)
             }
             if event["type"] in ["done", "error"]:
                 break
 
     return EventSourceResponse(event_generator())
 
+@app.get("/scrape/trace/{job_id}")
+async def get_trace(job_id: str):
+    path = trace_path(job_id)
+    if not os.path.exists(path):
+        return JSONResponse(status_code=404, content={"message": "No trace for this job (start it with trace: true)"})
+    return FileResponse(path, media_type="application/json", filename=f"trace_{job_id}.json")
+
 @app.get("/scrape/result/{job_id}")
 async def get_result(job_id: str):
     if job_id not in scraper_instance.jobs:
         return JSONResponse(status_code=404, content={"message": "Job not found"})
     return scraper_instance.jobs[job_id]
 
+# Responses at least this big are gzipped for clients that accept it
+GZIP_MIN_BYTES = 1024
+
+@app.get("/scrape/result/{job_id}/leads")
+async def query_results(
+    job_id: str,
+    request: Request,
+    fields: Optional[str] = None, # comma separated, e.g. "name,phone,rating"
+    limit: int = DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    has_phone: Optional[bool] = None,
+    has_website: Optional[bool] = None,
+    category: Optional[str] = None,
+    min_rating: Optional[float] = None,
+    q: Optional[str] = None, # text search on the name
+    sort: Optional[str] = None, # rating, reviews_count or name; "-" prefix for descending
+):
+    if job_id not in scraper_instance.jobs:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    job = scraper_instance.jobs[job_id]
+
+    etag = result_store.etag(job_id, job, str(request.query_params))
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    try:
+        page = result_store.page(
+            job_id, job, fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            limit=limit, cursor=cursor, has_phone=has_phone, has_website=has_website,
+            category=category, min_rating=min_rating, q=q, sort=sort,
+        )
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": str(e)})
+
+    body = dumps(page).encode("utf-8")
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, media_type="application/json", headers=headers)
+
 @app.get("/scrape/result/{job_id}.csv")
 async def get_csv(job_id: str):
     if job_id not in scraper_instance.jobs:
         return JSONResponse(status_code=404, content={"message": "Job not found"})
     
+    # pandas is only needed here: imported on first export, not at startup
+    import pandas as pd
+
     leads = scraper_instance.jobs[job_id]["leads"]
-    df = pd.DataFrame(leads)
+    df = pd.DataFrame([dict(lead) for lead in leads])
     
     file_path = f"results_{job_id}.csv"
     df.to_csv(file_path, index=False)
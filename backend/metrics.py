@@ -0,0 +1,136 @@
+"""
+In-process latency metrics for the scrapers, the analyzer and the senders.
+
+Every stage is wrapped in `timed("stage")`, which feeds a histogram (exported in
+Prometheus text format by main.py at /metrics) and, when a lead is being processed
+inside `lead_timings()`, that lead's own per-stage breakdown.
+"""
+
+import contextvars
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from tracing import current_tracer
+
+# Histogram bucket upper bounds, in seconds (Maps panel waits to slow AI calls)
+STAGE_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Raw observations kept per stage for exact percentiles (most recent ones)
+SAMPLES_PER_STAGE = 1000
+
+# (breakdown, start) of the lead currently being processed (per asyncio task)
+_lead_breakdown = contextvars.ContextVar("lead_breakdown", default=None)
+
+
+class StageMetrics:
+    def __init__(self, buckets=STAGE_BUCKETS_S):
+        self.buckets = buckets
+        self.histograms = {}  # stage -> {"counts": [per bucket + inf], "sum": s, "count": n}
+        self.counters = {}  # name -> int
+        self.samples = {}  # stage -> deque of recent seconds
+
+    def observe(self, stage: str, seconds: float):
+        histogram = self.histograms.setdefault(stage, {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0})
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                histogram["counts"][i] += 1
+                break
+        else:
+            histogram["counts"][-1] += 1
+        histogram["sum"] += seconds
+        histogram["count"] += 1
+        self.samples.setdefault(stage, deque(maxlen=SAMPLES_PER_STAGE)).append(seconds)
+
+    def percentile(self, stage: str, q: float) -> float:
+        """q in 0..100 over the recent raw samples of a stage (0.0 if none)"""
+        values = sorted(self.samples.get(stage, ()))
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.samples.clear()
+
+    def inc(self, name: str, value: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(stage, elapsed)
+            tracer = current_tracer()
+            if tracer is not None:
+                tracer.add_span(stage, start, elapsed)
+            current = _lead_breakdown.get()
+            if current is not None:
+                breakdown = current[0]
+                breakdown[stage] = round(breakdown.get(stage, 0.0) + elapsed, 3)
+
+    @contextmanager
+    def lead_timings(self):
+        """Collects the stages timed while processing one lead: {"stage": seconds, ...}"""
+        breakdown = {}
+        start = time.perf_counter()
+        token = _lead_breakdown.set((breakdown, start))
+        try:
+            yield breakdown
+        finally:
+            elapsed = time.perf_counter() - start
+            breakdown["total"] = round(elapsed, 3)
+            _lead_breakdown.reset(token)
+            self.observe("lead_total", elapsed)
+            tracer = current_tracer()
+            if tracer is not None:
+                tracer.add_span("lead", start, elapsed)
+
+    def current_lead_timings(self) -> dict:
+        """Breakdown so far of the lead being processed (what goes in its SSE event)"""
+        current = _lead_breakdown.get()
+        if current is None:
+            return {}
+        breakdown, start = current
+        return {**breakdown, "total": round(time.perf_counter() - start, 3)}
+
+    def summary(self) -> dict:
+        return {
+            stage: {"count": h["count"], "avg_s": h["sum"] / h["count"] if h["count"] else 0.0}
+            for stage, h in sorted(self.histograms.items())
+        }
+
+    def render_prometheus(self, upstream_stats: dict = None) -> str:
+        lines = [
+            "# HELP scraper_stage_seconds Time spent in each scrape stage",
+            "# TYPE scraper_stage_seconds histogram",
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram["counts"]):
+                cumulative += count
+                lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+            lines.append(f'scraper_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+            lines.append(f'scraper_stage_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+            lines.append(f'scraper_stage_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"# TYPE scraper_{name}_total counter")
+            lines.append(f"scraper_{name}_total {value}")
+
+        if upstream_stats:
+            lines.append("# TYPE upstream_requests_total counter")
+            lines.extend(f'upstream_requests_total{{upstream="{u}"}} {s["requests"]}' for u, s in upstream_stats.items())
+            lines.append("# TYPE upstream_errors_total counter")
+            lines.extend(f'upstream_errors_total{{upstream="{u}"}} {s["errors"]}' for u, s in upstream_stats.items())
+            lines.append("# TYPE upstream_latency_seconds_sum counter")
+            lines.extend(f'upstream_latency_seconds_sum{{upstream="{u}"}} {s["latency_total_s"]:.6f}' for u, s in upstream_stats.items())
+            lines.append("# TYPE upstream_latency_seconds_max gauge")
+            lines.extend(f'upstream_latency_seconds_max{{upstream="{u}"}} {s["latency_max_s"]:.6f}' for u, s in upstream_stats.items())
+        return "\n".join(lines) + "\n"
+
+
+metrics = StageMetrics()
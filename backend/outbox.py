@@ -0,0 +1,204 @@
+"""
+Durable delivery outbox for CLAVE.AI
+Persiste cada mensaje pendiente (WhatsApp via Evolution, webhooks de n8n) en una
+tabla SQLite con una llave de idempotencia, y lo entrega con reintentos,
+backoff exponencial y dead-lettering.
+
+Entrega at-least-once con dedup: un mensaje ya enviado nunca se vuelve a encolar,
+y uno que quedó pendiente por un crash se reintenta en la siguiente corrida.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+OUTBOX_FILE = os.getenv("OUTBOX_FILE", "outbox.db")
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+BACKOFF_BASE_S = float(os.getenv("OUTBOX_BACKOFF_BASE_S", "5"))
+BACKOFF_MAX_S = float(os.getenv("OUTBOX_BACKOFF_MAX_S", "600"))
+
+STATUS_PENDING = "pending"
+STATUS_SENT = "sent"
+STATUS_DEAD = "dead"
+
+# Mensajes iniciales (daily_scraper) y follow-ups (send_followups) van en canales
+# separados: cada script drena solo los suyos, con su propio callback de entrega
+CHANNEL_EVOLUTION_INITIAL = "evolution_initial"
+CHANNEL_EVOLUTION_FOLLOWUP = "evolution_followup"
+
+
+def make_idempotency_key(phone: str, stage: str, template_version: str) -> str:
+    """Llave de idempotencia: teléfono + etapa + versión de plantilla"""
+    return f"{phone}:{stage}:{template_version}"
+
+
+class DeliveryOutbox:
+    """
+    Tabla de salida persistente. Cada fila es un mensaje con su canal
+    ("evolution_initial", "evolution_followup" o "n8n"), su payload JSON y su estado de entrega.
+    """
+
+    def __init__(self, outbox_file=OUTBOX_FILE):
+        self.outbox_file = os.path.join(os.path.dirname(__file__), outbox_file)
+        self.conn = sqlite3.connect(self.outbox_file)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                channel TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                sent_at TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt_at)")
+        # Filas del antiguo canal compartido "evolution": se reparten por la etapa de su llave
+        self.conn.execute(
+            "UPDATE outbox SET channel = CASE WHEN idempotency_key LIKE '%:initial:%' THEN ? ELSE ? END "
+            "WHERE channel = 'evolution'",
+            (CHANNEL_EVOLUTION_INITIAL, CHANNEL_EVOLUTION_FOLLOWUP)
+        )
+        self.conn.commit()
+        # Llaves que otro drain de este proceso está entregando en este momento
+        self._in_flight = set()
+
+    def enqueue(self, channel: str, idempotency_key: str, payload: dict) -> bool:
+        """
+        Encola un mensaje. Retorna False si la llave ya existía (pendiente,
+        enviada o en dead-letter), así un mensaje nunca se duplica.
+        """
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO outbox (idempotency_key, channel, payload, created_at) VALUES (?, ?, ?, ?)",
+            (idempotency_key, channel, json.dumps(payload, ensure_ascii=False), datetime.now().isoformat())
+        )
+        self.conn.commit()
+        return cursor.rowcount > 0
+
+    def is_delivered(self, idempotency_key: str) -> bool:
+        row = self.conn.execute(
+            "SELECT status FROM outbox WHERE idempotency_key = ?", (idempotency_key,)
+        ).fetchone()
+        return row is not None and row["status"] == STATUS_SENT
+
+    def _is_pending(self, key):
+        row = self.conn.execute(
+            "SELECT status FROM outbox WHERE idempotency_key = ?", (key,)
+        ).fetchone()
+        return row is not None and row["status"] == STATUS_PENDING
+
+    def _due(self, channels, now):
+        placeholders = ",".join("?" for _ in channels)
+        return self.conn.execute(
+            f"SELECT * FROM outbox WHERE status = ? AND next_attempt_at <= ? AND channel IN ({placeholders}) "
+            f"ORDER BY created_at",
+            (STATUS_PENDING, now, *channels)
+        ).fetchall()
+
+    def _next_due_at(self, channels):
+        placeholders = ",".join("?" for _ in channels)
+        row = self.conn.execute(
+            f"SELECT MIN(next_attempt_at) AS due FROM outbox WHERE status = ? AND channel IN ({placeholders})",
+            (STATUS_PENDING, *channels)
+        ).fetchone()
+        return row["due"]
+
+    def _mark_sent(self, key):
+        self.conn.execute(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, last_error = NULL, sent_at = ? WHERE idempotency_key = ?",
+            (STATUS_SENT, datetime.now().isoformat(), key)
+        )
+        self.conn.commit()
+
+    def _mark_failed(self, key, attempts, error):
+        attempts += 1
+        if attempts >= MAX_ATTEMPTS:
+            self.conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, last_error = ? WHERE idempotency_key = ?",
+                (STATUS_DEAD, attempts, error, key)
+            )
+            print(f"[OUTBOX] ☠️  {key} movido a dead-letter tras {attempts} intentos: {error}")
+        else:
+            backoff = min(BACKOFF_BASE_S * (2 ** (attempts - 1)), BACKOFF_MAX_S)
+            self.conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE idempotency_key = ?",
+                (attempts, time.time() + backoff, error, key)
+            )
+            print(f"[OUTBOX] 🔁 {key} falló (intento {attempts}/{MAX_ATTEMPTS}), reintento en {backoff:.0f}s")
+        self.conn.commit()
+
+    async def drain(self, handlers: dict, pause=None, max_wait_s: float = 0) -> dict:
+        """
+        Entrega los mensajes pendientes de los canales en `handlers`
+        (canal -> async callable(payload) -> bool).
+
+        - pause: async callable opcional que se espera entre envíos (rate limiting)
+        - max_wait_s: cuánto esperar a que venzan los backoffs dentro de esta corrida;
+          lo que siga pendiente se reintenta en la próxima corrida.
+        """
+        channels = list(handlers.keys())
+        stats = {"sent": 0, "failed": 0, "dead": 0}
+        deadline = time.time() + max_wait_s
+
+        while True:
+            rows = self._due(channels, time.time())
+            if not rows:
+                next_due = self._next_due_at(channels)
+                if next_due is None or next_due > deadline:
+                    break
+                await asyncio.sleep(max(0.0, next_due - time.time()))
+                continue
+
+            rows = [row for row in rows if row["idempotency_key"] not in self._in_flight]
+            if not rows:
+                await asyncio.sleep(0.5)
+                continue
+
+            for row in rows:
+                key = row["idempotency_key"]
+                # Otro drain concurrente pudo haberlo tomado desde el SELECT
+                if key in self._in_flight or not self._is_pending(key):
+                    continue
+                self._in_flight.add(key)
+                try:
+                    ok = await handlers[row["channel"]](json.loads(row["payload"]))
+                    error = None if ok else "handler returned False"
+                except Exception as e:
+                    ok = False
+                    error = f"{type(e).__name__}: {e}"
+                finally:
+                    self._in_flight.discard(key)
+
+                if ok:
+                    self._mark_sent(key)
+                    stats["sent"] += 1
+                else:
+                    self._mark_failed(key, row["attempts"], error)
+                    if row["attempts"] + 1 >= MAX_ATTEMPTS:
+                        stats["dead"] += 1
+                    else:
+                        stats["failed"] += 1
+
+                if pause:
+                    await pause()
+
+        return stats
+
+    def get_stats(self) -> dict:
+        rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status").fetchall()
+        counts = {row["status"]: row["n"] for row in rows}
+        return {
+            "pending": counts.get(STATUS_PENDING, 0),
+            "sent": counts.get(STATUS_SENT, 0),
+            "dead": counts.get(STATUS_DEAD, 0),
+            "outbox_file": self.outbox_file
+        }
+
+    def close(self):
+        self.conn.close()
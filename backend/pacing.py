@@ -0,0 +1,82 @@
+"""
+Adaptive pacing shared by every scrape job and sender in the process.
+
+Each target ("maps", "google_serp", "evolution") has a delay factor applied on top of
+the configured delay ranges. Healthy signals (panels that load, fast responses) shrink
+it a little at a time; stress signals (CAPTCHA, HTTP 429, empty panels, slow loads)
+multiply it, so we speed up while Google is happy and back off fast when it isn't
+(additive decrease / multiplicative increase of the delay).
+"""
+
+import os
+import random
+import time
+
+PACING_MIN_FACTOR = float(os.getenv("PACING_MIN_FACTOR", "0.5"))
+PACING_MAX_FACTOR = float(os.getenv("PACING_MAX_FACTOR", "8"))
+# Delay factor removed per healthy signal
+PACING_RECOVERY_STEP = float(os.getenv("PACING_RECOVERY_STEP", "0.05"))
+# Delay factor multiplier per stress signal
+STRESS_BACKOFF = {
+    "captcha": 4.0,
+    "http_429": 2.0,
+    "empty_panel": 1.5,
+    "slow_load": 1.25,
+}
+# A load this many times slower than the running average counts as stress
+SLOW_LOAD_RATIO = 2.5
+LOAD_EWMA_ALPHA = 0.2
+CAPTCHA_SELECTOR = 'iframe[src*="recaptcha"], #captcha-form, #recaptcha'
+
+
+class PacingController:
+    def __init__(self):
+        self.targets = {}
+
+    def _state(self, target: str) -> dict:
+        return self.targets.setdefault(target, {
+            "factor": 1.0,
+            "load_avg_s": None,
+            "healthy": 0,
+            "stress": {},
+            "last_stress": None,
+        })
+
+    def delay(self, target: str, min_s: float, max_s: float) -> float:
+        """Seconds to wait: a random point of the configured range, scaled by the target's health"""
+        return random.uniform(min_s, max(min_s, max_s)) * self._state(target)["factor"]
+
+    def success(self, target: str, load_s: float = None):
+        state = self._state(target)
+        if load_s is not None:
+            average = state["load_avg_s"]
+            if average is not None and load_s > average * SLOW_LOAD_RATIO:
+                self.stress(target, "slow_load")
+                state["load_avg_s"] = average + LOAD_EWMA_ALPHA * (load_s - average)
+                return
+            state["load_avg_s"] = load_s if average is None else average + LOAD_EWMA_ALPHA * (load_s - average)
+        state["healthy"] += 1
+        state["factor"] = max(PACING_MIN_FACTOR, state["factor"] - PACING_RECOVERY_STEP)
+
+    def stress(self, target: str, kind: str):
+        state = self._state(target)
+        state["stress"][kind] = state["stress"].get(kind, 0) + 1
+        state["last_stress"] = time.time()
+        state["factor"] = min(PACING_MAX_FACTOR, state["factor"] * STRESS_BACKOFF.get(kind, 1.5))
+        print(f"[PACING] {target}: {kind} -> delay x{state['factor']:.2f}")
+
+    async def detect_captcha(self, page, target: str) -> bool:
+        """True (and a stress signal) if Google is showing a CAPTCHA on this page"""
+        try:
+            blocked = await page.locator(CAPTCHA_SELECTOR).count() > 0 or "/sorry/" in page.url
+        except Exception:
+            return False
+        if blocked:
+            self.stress(target, "captcha")
+        return blocked
+
+    def get_stats(self) -> dict:
+        return {target: dict(state, stress=dict(state["stress"])) for target, state in self.targets.items()}
+
+
+pacing = PacingController()
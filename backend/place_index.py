@@ -0,0 +1,140 @@
+"""
+Global index of Google Maps places we've already opened.
+Maps each canonical place ID (parsed from the /maps/place/ href, ignoring volatile
+query parameters) to when it was last seen and what came out of it, so scrapers can
+skip known businesses before clicking them.
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from urllib.parse import unquote, urlsplit
+
+from bloom import BloomFilter
+
+PLACE_INDEX_FILE = os.getenv("PLACE_INDEX_FILE", "place_index.json")
+# Places that didn't become a lead (no phone, no WhatsApp, error) are retried after this many days
+PLACE_INDEX_TTL_DAYS = int(os.getenv("PLACE_INDEX_TTL_DAYS", "60"))
+# Outcomes that never need a second visit
+FINAL_OUTCOMES = {"lead", "duplicate"}
+# Lead extracted but not yet delivered/emitted: revisited until it's promoted to "lead"
+# (a crash before delivery, a dead-lettered send or a dropped batch duplicate must not bury it)
+PENDING_OUTCOMES = {"extracted"}
+
+_PLACE_ID_RE = re.compile(r"!19s(ChIJ[\w-]+)")
+_FEATURE_ID_RE = re.compile(r"!1s(0x[0-9a-f]+:0x[0-9a-f]+)", re.IGNORECASE)
+_MID_RE = re.compile(r"!16s(/g/[\w-]+)")
+
+
+def canonical_place_id(href: str) -> str:
+    """
+    Stable ID for a /maps/place/ link: the Google place ID (ChIJ...) when present,
+    else the feature ID (0x...:0x...), else the /g/ MID, else the path without query.
+    """
+    if not href:
+        return ""
+    decoded = unquote(href)
+    for pattern in (_PLACE_ID_RE, _FEATURE_ID_RE, _MID_RE):
+        match = pattern.search(decoded)
+        if match:
+            return match.group(1)
+    parts = urlsplit(decoded)
+    return parts.path.rstrip("/")
+
+
+def href_selector(href: str) -> str:
+    """CSS selector for the <a> with exactly this href (to click it after filtering)"""
+    escaped = href.replace("\\", "\\\\").replace('"', '\\"')
+    return f'a[href="{escaped}"]'
+
+
+class PlaceIndex:
+    def __init__(self, index_file=PLACE_INDEX_FILE):
+        self.index_file = os.path.join(os.path.dirname(__file__), index_file)
+        # The JSON is only loaded when the Bloom filter can't rule a place out (or on save)
+        self._loaded = False
+        self._places = {}  # place_id -> {"last_seen": iso, "outcome": str}
+        self._updates = {}  # records from this run, merged into the JSON on save
+        self.place_filter = self._open_place_filter()
+
+    @property
+    def places(self) -> dict:
+        if not self._loaded:
+            self._loaded = True
+            self._load()
+        return self._places
+
+    def _open_place_filter(self):
+        try:
+            bloom_file = os.path.splitext(self.index_file)[0] + ".bloom"
+            place_filter = BloomFilter(bloom_file, self.index_file)
+            if place_filter.is_stale() or place_filter.overfull:
+                place_filter.rebuild(self.places.keys())
+            return place_filter
+        except Exception as e:
+            print(f"[PLACES] Bloom filter unavailable, using the JSON index only: {e}")
+            return None
+
+    def _load(self):
+        try:
+            if os.path.exists(self.index_file):
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    self._places = json.load(f).get("places", {})
+                print(f"[PLACES] Loaded {len(self._places)} known places")
+        except Exception as e:
+            print(f"[PLACES] Error loading place index: {e}")
+            self._places = {}
+
+    def save(self):
+        if not self._updates:
+            return
+        try:
+            self.places.update(self._updates)
+            data = {
+                "places": self.places,
+                "total_count": len(self.places),
+                "last_updated": datetime.now().isoformat()
+            }
+            with open(self.index_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            self._updates = {}
+            print(f"[PLACES] Saved {len(self.places)} places to index")
+            if self.place_filter is not None:
+                if self.place_filter.overfull:
+                    self.place_filter.rebuild(self.places.keys())
+                else:
+                    self.place_filter.mark_synced()
+        except Exception as e:
+            print(f"[PLACES] Error saving place index: {e}")
+
+    def get(self, place_id: str):
+        entry = self._updates.get(place_id)
+        if entry is not None:
+            return entry
+        # Bloom negative: definitely unknown, no need to load the JSON
+        if self.place_filter is not None and place_id not in self.place_filter:
+            return None
+        return self.places.get(place_id)
+
+    def should_skip(self, place_id: str) -> bool:
+        """True if the place is already known and not due for another look"""
+        entry = self.get(place_id)
+        if not entry:
+            return False
+        if entry.get("outcome") in FINAL_OUTCOMES:
+            return True
+        if entry.get("outcome") in PENDING_OUTCOMES:
+            return False
+        try:
+            age = datetime.now() - datetime.fromisoformat(entry.get("last_seen", ""))
+        except ValueError:
+            return False
+        return age.days < PLACE_INDEX_TTL_DAYS
+
+    def record(self, place_id: str, outcome: str):
+        if not place_id:
+            return
+        self._updates[place_id] = {"last_seen": datetime.now().isoformat(), "outcome": outcome}
+        if self.place_filter is not None:
+            self.place_filter.add(place_id)
@@ -0,0 +1,213 @@
+"""
+Pool of reusable browser profiles for scrape jobs.
+
+A profile is a user agent + locale + timezone plus a Playwright storage state (cookies,
+consent, local storage) saved from an earlier session. Jobs check one out, so they
+start with Google already "knowing" the browser: no consent screen and no warm-up wait,
+and fewer CAPTCHAs than a blank context. Profiles that keep hitting CAPTCHAs are retired
+and replaced; stale ones are re-warmed in the background.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+PROFILES_DIR = os.getenv("PROFILES_DIR", "profiles")
+PROFILE_POOL_SIZE = int(os.getenv("PROFILE_POOL_SIZE", "4"))
+# Re-warm a profile whose storage state is older than this
+PROFILE_MAX_AGE_H = float(os.getenv("PROFILE_MAX_AGE_H", "24"))
+# Retire a profile after this many CAPTCHAs
+PROFILE_MAX_CAPTCHAS = int(os.getenv("PROFILE_MAX_CAPTCHAS", "2"))
+PROFILE_REFRESH_INTERVAL_S = float(os.getenv("PROFILE_REFRESH_INTERVAL_S", "1800"))
+WARMUP_URL = "https://www.google.com/maps?hl=es-419"
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36",
+]
+LOCALES = ["es-MX", "es-419", "es-US"]
+TIMEZONE = "America/Mexico_City"
+CONSENT_SELECTOR = 'button[aria-label*="Accept"], button[aria-label*="Aceptar"]'
+
+
+class ProfileManager:
+    def __init__(self, pool_size: int = PROFILE_POOL_SIZE):
+        self.dir = os.path.join(os.path.dirname(__file__), PROFILES_DIR)
+        self.registry_file = os.path.join(self.dir, "profiles.json")
+        self.pool_size = pool_size
+        self.profiles = {}  # id -> profile metadata
+        self.checked_out = set()
+        self._refresh_task = None
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Registry
+    # ------------------------------------------------------------------
+    def _load(self):
+        try:
+            if os.path.exists(self.registry_file):
+                with open(self.registry_file, "r", encoding="utf-8") as f:
+                    self.profiles = json.load(f).get("profiles", {})
+        except Exception as e:
+            print(f"[PROFILES] Error loading profiles: {e}")
+            self.profiles = {}
+
+    def _save(self):
+        try:
+            os.makedirs(self.dir, exist_ok=True)
+            with open(self.registry_file, "w", encoding="utf-8") as f:
+                json.dump({"profiles": self.profiles}, f, indent=2)
+        except Exception as e:
+            print(f"[PROFILES] Error saving profiles: {e}")
+
+    def _new_profile(self) -> dict:
+        profile_id = uuid.uuid4().hex[:8]
+        profile = {
+            "id": profile_id,
+            "user_agent": random.choice(USER_AGENTS),
+            "locale": random.choice(LOCALES),
+            "state_file": os.path.join(self.dir, f"{profile_id}.state.json"),
+            "warmed_at": None,
+            "uses": 0,
+            "captchas": 0,
+        }
+        self.profiles[profile_id] = profile
+        return profile
+
+    def _is_warm(self, profile: dict) -> bool:
+        return bool(profile["warmed_at"]) and os.path.exists(profile["state_file"]) and \
+            time.time() - profile["warmed_at"] < PROFILE_MAX_AGE_H * 3600
+
+    # ------------------------------------------------------------------
+    # Checkout / checkin
+    # ------------------------------------------------------------------
+    def checkout(self) -> dict:
+        """Least recently used warm profile not in use; a new cold one if there is none"""
+        available = [p for p in self.profiles.values() if p["id"] not in self.checked_out]
+        warm = sorted((p for p in available if self._is_warm(p)), key=lambda p: p.get("last_used", 0))
+        profile = warm[0] if warm else (available[0] if len(self.profiles) >= self.pool_size and available else self._new_profile())
+        self.checked_out.add(profile["id"])
+        profile["last_used"] = time.time()
+        return profile
+
+    def context_kwargs(self, profile: dict) -> dict:
+        """browser.new_context() arguments for this profile"""
+        kwargs = {"user_agent": profile["user_agent"], "locale": profile["locale"], "timezone_id": TIMEZONE}
+        if os.path.exists(profile["state_file"]):
+            kwargs["storage_state"] = profile["state_file"]
+        return kwargs
+
+    def is_warm(self, profile: dict) -> bool:
+        """Warm profiles already accepted consent: jobs can skip the consent probe and warm-up wait"""
+        return self._is_warm(profile)
+
+    def report_captcha(self, profile: dict):
+        profile["captchas"] += 1
+
+    async def checkin(self, profile: dict, context=None):
+        """Return a profile, keeping the session's updated cookies (or retiring it)"""
+        self.checked_out.discard(profile["id"])
+        profile["uses"] += 1
+        if profile["captchas"] >= PROFILE_MAX_CAPTCHAS:
+            self._retire(profile)
+        elif context is not None:
+            try:
+                os.makedirs(self.dir, exist_ok=True)
+                await context.storage_state(path=profile["state_file"])
+                profile["warmed_at"] = profile["warmed_at"] or time.time()
+            except Exception as e:
+                print(f"[PROFILES] Could not save state of {profile['id']}: {e}")
+        self._save()
+
+    def _retire(self, profile: dict):
+        print(f"[PROFILES] Retiring {profile['id']} after {profile['captchas']} CAPTCHAs")
+        self.profiles.pop(profile["id"], None)
+        try:
+            os.remove(profile["state_file"])
+        except FileNotFoundError:
+            pass
+
+    # ------------------------------------------------------------------
+    # Warm-up
+    # ------------------------------------------------------------------
+    async def warm(self, browser, profile: dict):
+        """Visit Maps once, accept consent and save the resulting storage state"""
+        context = await browser.new_context(**self.context_kwargs(profile))
+        try:
+            page = await context.new_page()
+            await page.goto(WARMUP_URL, wait_until="domcontentloaded", timeout=60000)
+            try:
+                consent_btn = page.locator(CONSENT_SELECTOR)
+                if await consent_btn.is_visible(timeout=5000):
+                    await consent_btn.click()
+            except Exception:
+                pass
+            await asyncio.sleep(3)
+            os.makedirs(self.dir, exist_ok=True)
+            await context.storage_state(path=profile["state_file"])
+            profile["warmed_at"] = time.time()
+            print(f"[PROFILES] Warmed {profile['id']} ({profile['locale']})")
+        finally:
+            await context.close()
+
+    async def refresh(self, browser):
+        """Top the pool up to pool_size and re-warm stale profiles that aren't in use"""
+        while len(self.profiles) < self.pool_size:
+            self._new_profile()
+        for profile in list(self.profiles.values()):
+            if profile["id"] in self.checked_out or self._is_warm(profile):
+                continue
+            try:
+                await self.warm(browser, profile)
+            except Exception as e:
+                print(f"[PROFILES] Warm-up failed for {profile['id']}: {e}")
+        self._save()
+
+    async def _refresh_loop(self):
+        from playwright.async_api import async_playwright
+
+        while True:
+            try:
+                async with async_playwright() as p:
+                    if not os.path.exists(p.chromium.executable_path):
+                        # Nothing to retry on a host without a browser
+                        print("[PROFILES] Chromium is not installed; background refresh disabled")
+                        return
+                    browser = await p.chromium.launch(headless=True)
+                    try:
+                        await self.refresh(browser)
+                    finally:
+                        await browser.close()
+            except Exception as e:
+                print(f"[PROFILES] Background refresh error: {e}")
+            await asyncio.sleep(PROFILE_REFRESH_INTERVAL_S)
+
+    def start_background_refresh(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop_background_refresh(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def get_stats(self) -> dict:
+        return {
+            "pool_size": self.pool_size,
+            "profiles": len(self.profiles),
+            "warm": sum(1 for p in self.profiles.values() if self._is_warm(p)),
+            "checked_out": len(self.checked_out),
+        }
+
+
+profile_manager = ProfileManager()
@@ -0,0 +1,29 @@
+"""
+Global lead quota shared by concurrent scrapes (campaign targets, batch sub-jobs).
+Everything runs on one event loop, so claim checks need no lock as long as they don't await.
+"""
+
+
+class LeadQuota:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.claimed = set()
+
+    @property
+    def taken(self) -> int:
+        return len(self.claimed)
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.limit - self.taken)
+
+    @property
+    def exhausted(self) -> bool:
+        return self.taken >= self.limit
+
+    def try_claim(self, key: str) -> bool:
+        """Reserve one slot for `key`. False if the quota is full or another scrape already claimed it."""
+        if self.exhausted or key in self.claimed:
+            return False
+        self.claimed.add(key)
+        return True
@@ -0,0 +1,137 @@
+"""
+Server-side querying of a job's leads (GET /scrape/result/{job_id}/leads).
+
+Each job gets a LeadIndex over its lead list: category buckets, has-phone/has-website
+sets and parsed ratings/review counts/lowercased names. Leads are only ever appended
+to a job, so the index just catches up on the new tail before each query instead of
+rescanning every lead. Pages are addressed by an opaque cursor (offset into the
+filtered, sorted result).
+"""
+
+import base64
+import hashlib
+import json
+import re
+from typing import List, Optional
+
+# Returned when the client doesn't ask for specific fields (website text and AI message are heavy)
+DEFAULT_FIELDS = ("name", "category", "address", "phone", "website", "rating", "reviews_count", "google_maps_url")
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+SORT_FIELDS = ("rating", "reviews_count", "name")
+
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)?")
+
+
+def parse_rating(value) -> Optional[float]:
+    match = _NUMBER_RE.search(str(value or ""))
+    return float(match.group(0).replace(",", ".")) if match else None
+
+
+def parse_count(value) -> int:
+    digits = "".join(filter(str.isdigit, str(value or "")))
+    return int(digits) if digits else 0
+
+
+def encode_cursor(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"o": offset}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Offset encoded in a cursor; ValueError if it isn't one of ours"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return max(0, int(json.loads(base64.urlsafe_b64decode(padded))["o"]))
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class LeadIndex:
+    def __init__(self):
+        self.leads = None
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.by_category = {}  # lowercased category -> positions
+        self.with_phone = set()
+        self.with_website = set()
+        self.ratings = []  # position -> float or None
+        self.reviews = []  # position -> int
+        self.names = []  # position -> lowercased name
+
+    def refresh(self, leads: list):
+        """Index leads appended since the last query (the whole list if the job was restarted)"""
+        if leads is not self.leads:
+            self.leads = leads
+            self._reset()
+        for position in range(self.size, len(leads)):
+            lead = leads[position]
+            self.by_category.setdefault((lead.get("category") or "").strip().lower(), []).append(position)
+            if lead.get("phone"):
+                self.with_phone.add(position)
+            if lead.get("website"):
+                self.with_website.add(position)
+            self.ratings.append(parse_rating(lead.get("rating")))
+            self.reviews.append(parse_count(lead.get("reviews_count")))
+            self.names.append((lead.get("name") or "").lower())
+        self.size = len(leads)
+
+    def query(self, has_phone: Optional[bool] = None, has_website: Optional[bool] = None, category: Optional[str] = None,
+              min_rating: Optional[float] = None, q: Optional[str] = None, sort: Optional[str] = None) -> List[int]:
+        """Positions of the matching leads, in job order unless `sort` ("rating", "-rating", "name", ...)"""
+        if category:
+            positions = list(self.by_category.get(category.strip().lower(), []))
+        else:
+            positions = list(range(self.size))
+
+        if has_phone is not None:
+            positions = [i for i in positions if (i in self.with_phone) == has_phone]
+        if has_website is not None:
+            positions = [i for i in positions if (i in self.with_website) == has_website]
+        if min_rating is not None:
+            positions = [i for i in positions if self.ratings[i] is not None and self.ratings[i] >= min_rating]
+        if q:
+            needle = q.lower()
+            positions = [i for i in positions if needle in self.names[i]]
+
+        if sort:
+            field = sort.lstrip("-")
+            if field not in SORT_FIELDS:
+                raise ValueError(f"Can't sort by {field} (one of {', '.join(SORT_FIELDS)})")
+            keys = {"rating": lambda i: self.ratings[i] or 0.0, "reviews_count": lambda i: self.reviews[i], "name": lambda i: self.names[i]}[field]
+            positions.sort(key=keys, reverse=sort.startswith("-"))
+        return positions
+
+
+class ResultStore:
+    """One LeadIndex per job, over the leads kept in GMapsScraper.jobs"""
+
+    def __init__(self):
+        self.indexes = {}
+
+    def page(self, job_id: str, job: dict, fields: Optional[List[str]] = None, limit: int = DEFAULT_PAGE_SIZE,
+             cursor: Optional[str] = None, **filters) -> dict:
+        index = self.indexes.setdefault(job_id, LeadIndex())
+        index.refresh(job["leads"])
+        positions = index.query(**filters)
+
+        offset = decode_cursor(cursor) if cursor else 0
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        fields = fields or DEFAULT_FIELDS
+        leads = [{field: index.leads[i].get(field) for field in fields} for i in positions[offset:offset + limit]]
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "total": len(positions),
+            "leads": leads,
+            "next_cursor": encode_cursor(offset + limit) if offset + limit < len(positions) else None,
+        }
+
+    def etag(self, job_id: str, job: dict, query: str) -> str:
+        """Changes whenever the job gains leads or changes status (leads aren't edited once emitted)"""
+        digest = hashlib.md5(query.encode()).hexdigest()[:12]
+        return f'W/"{job_id}-{len(job["leads"])}-{job["status"]}-{digest}"'
+
+
+result_store = ResultStore()
@@ -1,24 +1,72 @@
 import asyncio
-import random
+import time
 import uuid
-import pandas as pd
-from playwright.async_api import async_playwright
-from analyzer import ai_analyzer
-from sse_starlette.sse import EventSourceResponse
+from contextlib import asynccontextmanager
 from typing import Dict, List, Optional
 import json
 import os
-import httpx
 from dotenv import load_dotenv
+from http_clients import http_clients
+from outbox import DeliveryOutbox, make_idempotency_key
+from place_index import PlaceIndex, canonical_place_id, href_selector
+from checkpoint import JobCheckpoint
+from metrics import metrics
+from tracing import JobTracer
+from sessions import LIVE, ScrapeSession
+from pacing import pacing
+from captcha import handoff_captcha
+from profiles import profile_manager
+from quota import LeadQuota
+from warehouse import warehouse
+from leads import Lead, TextStore
+from deadline import LeadDeadline
+from instagram import InstagramHarvester, RESULT_SELECTOR, instagram_enricher, profile_snippet, profile_username
 
 load_dotenv()
 
+# Bump when the n8n payload/message format changes (part of the outbox idempotency key)
+N8N_TEMPLATE_VERSION = "v1"
+# Jobs run headless; CAPTCHAs are handed off to a human (see captcha.py). false = always headed
+SCRAPER_HEADLESS = os.getenv("SCRAPER_HEADLESS", "true").lower() == "true"
+# Sub-jobs of a /scrape/batch request running at once (one context each, on one shared Chromium)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+
+
+class ScrapeBatch:
+    """State shared by the sub-jobs of a batch: one global lead quota and cross-query dedupe"""
+
+    def __init__(self, max_leads: int):
+        self.quota = LeadQuota(max_leads)
+        self.seen_places = set()  # canonical Maps place IDs opened by any sub-job
+        self.seen_profiles = set()  # Instagram usernames harvested by any sub-job
+
+    def claim(self, lead: dict) -> bool:
+        """Reserve a quota slot for the lead; False if the quota is full or another query already got this business"""
+        phone = "".join(filter(str.isdigit, lead.get("phone") or ""))
+        return self.quota.try_claim(phone or lead.get("google_maps_url", ""))
+
+
 class GMapsScraper:
     def __init__(self):
         self.jobs = {}
         self.n8n_webhook_url = os.getenv("N8N_WEBHOOK_URL")
+        self._outbox = None
+        self._place_index = None
+
+    @property
+    def place_index(self) -> PlaceIndex:
+        if self._place_index is None:
+            self._place_index = PlaceIndex()
+        return self._place_index
+
+    @property
+    def outbox(self) -> DeliveryOutbox:
+        if self._outbox is None:
+            self._outbox = DeliveryOutbox()
+        return self._outbox
 
     async def send_to_n8n(self, lead):
+        """Queue the lead in the durable outbox and drain whatever n8n deliveries are due"""
         print(f"[DEBUG] send_to_n8n called. Webhook URL: {self.n8n_webhook_url}")
         print(f"[DEBUG] Lead phone: '{lead.get('phone')}'")
         
@@ -30,32 +78,143 @@ class GMapsScraper:
             print("[DEBUG] No phone number in lead, skipping")
             return
         
+        # Clean phone number (Evolution API expects digits, usually with country code)
+        clean_phone = "".join(filter(str.isdigit, lead["phone"]))
+        payload = {
+            "phone": clean_phone,
+            "message": lead["ai_analysis"],
+            "lead_name": lead["name"],
+            "category": lead["category"],
+            "website": lead["website"]
+        }
+        key = make_idempotency_key(clean_phone, "n8n", N8N_TEMPLATE_VERSION)
+        if not self.outbox.enqueue("n8n", key, payload):
+            print(f"[OUTBOX] {key} already queued or delivered, skipping")
+        
+        await self.drain_n8n_outbox()
+
+    async def drain_n8n_outbox(self, max_wait_s: float = 0):
         try:
-            # Clean phone number (Evolution API expects digits, usually with country code)
-            clean_phone = "".join(filter(str.isdigit, lead["phone"]))
-            
-            async with httpx.AsyncClient() as client:
-                payload = {
-                    "phone": clean_phone,
-                    "message": lead["ai_analysis"],
-                    "lead_name": lead["name"],
-                    "category": lead["category"],
-                    "website": lead["website"]
-                }
-                response = await client.post(self.n8n_webhook_url, json=payload, timeout=10.0)
-                print(f"n8n Webhook response: {response.status_code}")
+            await self.outbox.drain({"n8n": self._post_to_n8n}, max_wait_s=max_wait_s)
         except Exception as e:
-            print(f"Error sending to n8n: {e}")
+            print(f"Error draining n8n outbox: {e}")
+
+    async def _post_to_n8n(self, payload) -> bool:
+        with metrics.timed("n8n"):
+            response = await http_clients.post("n8n", self.n8n_webhook_url, json=payload)
+        print(f"n8n Webhook response: {response.status_code}")
+        return 200 <= response.status_code < 300
+
+    async def scrape(self, job_id: str, url: str, mode: str, max_leads: int, delay_min: int, delay_max: int, extract_website: bool, extract_phone: bool, status_callback, auto_send_n8n: bool = False, skip_known_places: bool = False, resume: bool = False, trace: bool = False, session: ScrapeSession = None):
+        job = self._run_scrape(job_id, url, mode, max_leads, delay_min, delay_max, extract_website, extract_phone,
+                               status_callback, auto_send_n8n, skip_known_places, resume, session or LIVE)
+        if not trace:
+            return await job
+        # Opt-in timeline of the job (Chrome Trace Event JSON, served at /scrape/trace/{job_id})
+        tracer = JobTracer(job_id)
+        with tracer.activate():
+            try:
+                return await job
+            finally:
+                tracer.save()
+
+    async def scrape_batch(self, batch_id: str, urls: List[str], mode: str, max_leads: int, delay_min: int, delay_max: int, extract_website: bool, extract_phone: bool, status_callback, auto_send_n8n: bool = False, skip_known_places: bool = False, concurrency: int = BATCH_CONCURRENCY):
+        """
+        Many queries as one unit of work: sub-jobs `{batch_id}-{i}` share one Chromium, a global
+        max_leads and place/profile dedupe. Their events are forwarded to `status_callback` tagged
+        with the sub-job; the batch's own "done" comes after all of them.
+        """
+        batch = ScrapeBatch(max_leads)
+        sub_jobs = {f"{batch_id}-{i}": url for i, url in enumerate(urls)}
+        self.jobs[batch_id] = {
+            "status": "running", "leads": [], "error": None,
+            "sub_jobs": {sub_id: {"url": url, "status": "queued", "leads": 0} for sub_id, url in sub_jobs.items()},
+        }
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+
+        async def run_sub_job(browser, sub_id, url):
+            async with semaphore:
+                info = self.jobs[batch_id]["sub_jobs"][sub_id]
+                if batch.quota.exhausted:
+                    info["status"] = "skipped"
+                    await status_callback({"type": "sub_job", "sub_job_id": sub_id, "url": url, "state": "skipped"})
+                    return
+                info["status"] = "running"
+                await status_callback({"type": "sub_job", "sub_job_id": sub_id, "url": url, "state": "running"})
+
+                async def sub_callback(event):
+                    if event["type"] == "lead":
+                        self.jobs[batch_id]["leads"].append(event["data"])
+                        info["leads"] += 1
+                        event = dict(event, count=len(self.jobs[batch_id]["leads"]))
+                    elif event["type"] in ("done", "error"):
+                        # Only the batch itself ends the aggregated stream
+                        info["status"] = event["type"]
+                        event = {"type": "sub_job", "url": url, "state": event["type"], "message": event.get("message", "")}
+                    await status_callback(dict(event, sub_job_id=sub_id))
+
+                await self._run_scrape(sub_id, url, mode, max_leads, delay_min, delay_max, extract_website, extract_phone,
+                                       sub_callback, auto_send_n8n, skip_known_places, False, LIVE, browser=browser, batch=batch)
+
+        try:
+            async with self._browser() as browser:
+                await asyncio.gather(*(run_sub_job(browser, sub_id, url) for sub_id, url in sub_jobs.items()))
+            self.jobs[batch_id]["status"] = "done"
+            await status_callback({"type": "done", "job_id": batch_id})
+        except Exception as e:
+            self.jobs[batch_id]["status"] = "error"
+            self.jobs[batch_id]["error"] = str(e)
+            await status_callback({"type": "error", "message": str(e)})
+
+    @asynccontextmanager
+    async def _browser(self, shared_browser=None):
+        """The batch's shared Chromium if there is one, else a browser of our own for this job"""
+        if shared_browser is not None:
+            yield shared_browser
+            return
+        # Imported on first job, not when the API starts
+        from playwright.async_api import async_playwright
 
-    async def scrape(self, job_id: str, url: str, mode: str, max_leads: int, delay_min: int, delay_max: int, extract_website: bool, extract_phone: bool, status_callback, auto_send_n8n: bool = False):
-        self.jobs[job_id] = {"status": "running", "leads": [], "error": None}
-        
         async with async_playwright() as p:
-            # Set headless=False so the user can see if Google blocks with CAPTCHA
-            browser = await p.chromium.launch(headless=False)
-            context = await browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
+            browser = await p.chromium.launch(headless=SCRAPER_HEADLESS)
+            try:
+                yield browser
+            finally:
+                await browser.close()
+
+    def _quota_reached(self, leads_count: int, max_leads: int, batch) -> bool:
+        if batch is not None and batch.quota.exhausted:
+            return True
+        return leads_count >= max_leads
+
+    async def _run_scrape(self, job_id, url, mode, max_leads, delay_min, delay_max, extract_website, extract_phone, status_callback, auto_send_n8n, skip_known_places, resume, session, browser=None, batch=None):
+        checkpoint = JobCheckpoint.load(job_id) if resume else None
+        if checkpoint is None:
+            checkpoint = JobCheckpoint(job_id, params={
+                "url": url, "mode": mode, "max_leads": max_leads, "delay_min": delay_min, "delay_max": delay_max,
+                "extract_website": extract_website, "extract_phone": extract_phone,
+                "auto_send_n8n": auto_send_n8n, "skip_known_places": skip_known_places,
+            })
+            checkpoint.save()
+        state = checkpoint.section("main")
+        self.jobs[job_id] = {"status": "running", "leads": list(state["leads"]), "error": None}
+        source = "batch" if batch is not None else "api"
+        started = time.time()
+        # Lead texts of this job, deduplicated (freed together with the job's leads)
+        text_store = TextStore()
+
+        if state["leads"] or state["pending"]:
+            await status_callback({"type": "status", "message": f"Resuming from checkpoint: {len(state['leads'])} leads, {len(state['processed_ids'])} places already processed"})
+            for i, lead in enumerate(state["leads"], start=1):
+                await status_callback({"type": "lead", "data": lead, "count": i})
+        
+        async with self._browser(browser) as browser:
+            # Live by default; record/replay capture or serve the network through a HAR
+            if session.mode == "record":
+                session.url = url
+            # Warmed profile: cookies/consent from earlier sessions, rotating UA and locale
+            profile = profile_manager.checkout()
+            context = await session.new_context(browser, **profile_manager.context_kwargs(profile))
             page = await context.new_page()
             
             try:
@@ -64,210 +223,271 @@ class GMapsScraper:
                 print(f"Query: {url}")
                 
                 if mode == "instagram":
-                    import urllib.parse
-                    # Broad search for better results
-                    search_query = urllib.parse.quote(f"site:instagram.com {url}")
-                    google_url = f"https://www.google.com/search?q={search_query}"
-                    
                     await status_callback({"type": "status", "message": f"Searching Google for Instagram profiles: {url}"})
-                    await page.goto(google_url, wait_until="domcontentloaded", timeout=60000)
-                    
-                    leads_count = 0
-                    while leads_count < max_leads:
-                        # More robust result selectors for various Google layouts
-                        result_selector = 'div.g, div.tF2Cxc, div.MjjYud, div.sr_item, div.SearchCard'
-                        results = await page.locator(result_selector).all()
-                        
-                        if not results:
-                            # Use a very broad search for any Instagram links to see if they exist
-                            links = await page.locator('a[href*="instagram.com"]').all()
-                            if links:
-                                results = links # Treat direct links as results if containers aren't found
-                        
-                        if not results:
-                            page_content = await page.content()
-                            # Check for actual blocking elements, not just text in the page
-                            is_captcha = await page.locator('iframe[src*="recaptcha"], #captcha-form, #recaptcha').count() > 0
-                            
-                            if is_captcha or "detecting unusual traffic" in page_content.lower():
-                                await status_callback({"type": "status", "message": "⚠️ CAPTCHA detected! Please solve it in the browser window now..."})
-                                try:
-                                    # Wait for any of the result selectors to appear
-                                    await page.wait_for_selector(result_selector, timeout=300000)
-                                    await status_callback({"type": "status", "message": "CAPTCHA solved! Resuming search..."})
-                                    results = await page.locator(result_selector).all()
-                                except:
-                                    await status_callback({"type": "error", "message": "Timeout: CAPTCHA was not solved in time."})
-                                    return
-                            else:
-                                break
-                            
-                        if not results: break 
-                            
-                        for result in results:
-                            if leads_count >= max_leads: break
-                            
-                            try:
-                                # If it's a div.g, find the link inside
-                                if await result.evaluate("node => node.tagName") == "DIV":
-                                    link_elem = result.locator('a[href*="instagram.com"]').first
-                                else:
-                                    link_elem = result # It's already the link element
-
-                                if not await link_elem.is_visible():
-                                    continue
-                                    
-                                href = await link_elem.get_attribute("href")
-                                if not href or "/p/" in href or "/reels/" in href or "/explore/" in href:
-                                    continue 
-                                
-                                # Try to get title
-                                try:
-                                    title = await result.locator('h3').inner_text()
-                                except:
-                                    title = await link_elem.inner_text()
-                                
-                                # Clean username
-                                try:
-                                    username = href.split("instagram.com/")[1].split("/")[0].split("?")[0]
-                                except:
-                                    username = "User"
 
+                    async def on_captcha(blocked_page):
+                        profile_manager.report_captcha(profile)
+                        # Hand the session to a human until any of the result selectors appears
+                        with metrics.timed("captcha_wait"):
+                            return await handoff_captcha(job_id, browser, context, blocked_page, RESULT_SELECTOR, status_callback, SCRAPER_HEADLESS)
+
+                    leads_count = len(state["leads"])
+                    # processed_ids holds usernames (older checkpoints: profile hrefs)
+                    # Shared with the other sub-jobs of a batch (cross-query dedupe)
+                    seen = batch.seen_profiles if batch is not None else set()
+                    seen.update((profile_username(pid) or pid).lower() for pid in state["processed_ids"])
+                    harvester = InstagramHarvester(context, url, seen)
+                    for lead in list(state["pending"]):
+                        leads_count, _ = await self._finish_lead(job_id, lead, state, checkpoint, leads_count, status_callback, auto_send_n8n, batch)
+                    while not self._quota_reached(leads_count, max_leads, batch) and not harvester.done:
+                        # Whole result pages at a time: one evaluate per page, a few pages in parallel
+                        harvested = await harvester.next_batch(max_leads - leads_count, on_captcha)
+                        # Public profile metadata for all of them (bounded concurrency, cached per username)
+                        enriched = await instagram_enricher.fetch_many([found["username"] for found in harvested])
+                        for found, ig_profile in zip(harvested, enriched):
+                            if self._quota_reached(leads_count, max_leads, batch): break
+
+                            with metrics.lead_timings():
+                                username, title = found["username"], found["title"] or found["username"]
+                                state["processed_ids"].append(username.lower())
                                 print(f"MATCH: Found profile @{username}")
-                                
-                                lead = {
-                                    "name": title.split("•")[0].strip() if "•" in title else title,
-                                    "category": "Instagram Profile",
+                                ig_profile = ig_profile or {}
+
+                                lead = Lead({
+                                    "name": ig_profile.get("full_name") or (title.split("•")[0].strip() if "•" in title else title),
+                                    "category": ig_profile.get("category") or "Instagram Profile",
                                     "address": "Instagram",
-                                    "phone": "",
-                                    "website": href,
+                                    "phone": ig_profile.get("phone", ""),
+                                    "email": ig_profile.get("email", ""),
+                                    "website": ig_profile.get("external_url") or found["url"],
                                     "rating": "N/A",
                                     "reviews_count": "0",
-                                    "google_maps_url": href,
-                                    "website_snippet": f"Instagram Profile: @{username}",
+                                    "google_maps_url": found["url"],
+                                    "website_snippet": profile_snippet(username, ig_profile),
                                     "ai_analysis": f"¡Hola! Vi el perfil de {username} en Instagram y me encantó su contenido. Noté que podrían potenciar mucho más su marca con un sitio web automatizado que convierta seguidores en clientes las 24/7.\n\nEn CLAVE.AI nos especializamos en esto. ¡Te invito a conocer nuestros servicios en https://claveai.com.mx y ver nuestro trabajo en https://www.instagram.com/claveai/!"
-                                }
-                                
-                                self.jobs[job_id]["leads"].append(lead)
-                                leads_count += 1
-                                await status_callback({"type": "lead", "data": lead, "count": leads_count})
-                                
-                                if auto_send_n8n and lead.get("phone"):
-                                    await self.send_to_n8n(lead)
-                                    
-                                await asyncio.sleep(random.randint(delay_min, delay_max) / 1000)
-                                
-                            except Exception as e:
-                                continue
-                                
-                        # Check for "Next" page
-                        next_btn = page.locator('a#pnnext')
-                        if await next_btn.is_visible():
-                            await next_btn.click()
-                            await asyncio.sleep(2)
-                        else:
-                            break
+                                }, store=text_store)
+
+                                # Same AI/delivery pipeline as Maps leads
+                                state["pending"].append(lead)
+                                checkpoint.save()
+                                leads_count, _ = await self._finish_lead(job_id, lead, state, checkpoint, leads_count, status_callback, auto_send_n8n, batch)
+
+                    if harvester.blocked:
+                        await status_callback({"type": "error", "message": "Timeout: CAPTCHA was not solved in time."})
+                        return
                             
                 else:
                     # ORIGINAL GOOGLE MAPS FLOW
                     await status_callback({"type": "status", "message": f"Navigating to Maps: {url}"})
                     # Increased timeout and more lenient wait condition
-                    await page.goto(url, wait_until="domcontentloaded", timeout=60000)
-                    await asyncio.sleep(5) # Wait a bit more for the elements to appear
+                    with metrics.timed("navigate"):
+                        await page.goto(url, wait_until="domcontentloaded", timeout=60000)
+                        # Wait for the first results instead of a fixed sleep (capped at the old 5s)
+                        try:
+                            await page.wait_for_selector('a[href*="/maps/place/"]', timeout=5000)
+                        except Exception:
+                            pass
                     
-                    # Handle cookie consent if it appears
-                    try:
-                        consent_btn = page.locator('button[aria-label*="Accept"], button[aria-label*="Aceptar"]')
-                        if await consent_btn.is_visible(timeout=5000):
-                            await consent_btn.click()
-                    except:
-                        pass
-
-                    leads_count = 0
-                    processed_urls = set()
-
-                    while leads_count < max_leads:
+                    # Handle cookie consent if it appears (warm profiles already accepted it)
+                    if not profile_manager.is_warm(profile):
+                        try:
+                            consent_btn = page.locator('button[aria-label*="Accept"], button[aria-label*="Aceptar"]')
+                            if await consent_btn.is_visible(timeout=5000):
+                                await consent_btn.click()
+                        except:
+                            pass
+
+                    leads_count = len(state["leads"])
+                    # Shared with the other sub-jobs of a batch (cross-query dedupe)
+                    processed_ids = batch.seen_places if batch is not None else set()
+                    processed_ids.update(state["processed_ids"])
+                    stale_rounds = 0
+
+                    # Resume: bring the feed back to where it was, then finish leads caught mid-pipeline
+                    for _ in range(state["scroll_steps"]):
+                        await page.mouse.wheel(0, 3000)
+                        await session.wait(0.5)
+                    for lead in list(state["pending"]):
+                        leads_count, emitted = await self._finish_lead(job_id, lead, state, checkpoint, leads_count, status_callback, auto_send_n8n, batch)
+                        if emitted:
+                            self.place_index.record(canonical_place_id(lead["google_maps_url"]), "lead")
+
+                    while not self._quota_reached(leads_count, max_leads, batch):
                         # Find business links
-                        # Google Maps link selector for results
-                        links = await page.locator('a[href*="/maps/place/"]').all()
+                        # Google Maps link selector for results (all hrefs in one round trip)
+                        hrefs = await page.locator('a[href*="/maps/place/"]').evaluate_all("els => els.map(e => e.getAttribute('href'))")
                         
-                        if not links:
+                        if not hrefs:
                             await status_callback({"type": "info", "message": "No more results found or loading..."})
                             # Try scrolling to load more
                             await page.mouse.wheel(0, 5000)
-                            await asyncio.sleep(2)
-                            links = await page.locator('a[href*="/maps/place/"]').all()
-                            if not links:
+                            await session.wait(pacing.delay("maps", 1.5, 2.5))
+                            hrefs = await page.locator('a[href*="/maps/place/"]').evaluate_all("els => els.map(e => e.getAttribute('href'))")
+                            if not hrefs:
+                                if await pacing.detect_captcha(page, "maps"):
+                                    profile_manager.report_captcha(profile)
+                                    with metrics.timed("captcha_wait"):
+                                        solved = await handoff_captcha(job_id, browser, context, page, 'a[href*="/maps/place/"]', status_callback, SCRAPER_HEADLESS)
+                                    if solved:
+                                        continue
                                 break
 
-                        for link in links:
-                            if leads_count >= max_leads:
+                        new_in_round = 0
+                        for href in hrefs:
+                            if self._quota_reached(leads_count, max_leads, batch):
                                 break
                             
-                            href = await link.get_attribute("href")
-                            if href in processed_urls:
+                            # Dedupe on the canonical place ID, not the raw href (volatile query params)
+                            place_id = canonical_place_id(href)
+                            if place_id in processed_ids:
                                 continue
                                 
-                            processed_urls.add(href)
+                            processed_ids.add(place_id)
+                            state["processed_ids"].append(place_id)
+                            new_in_round += 1
                             
-                            try:
-                                # Click to open details
-                                await link.click()
-                                await asyncio.sleep(random.randint(delay_min, delay_max) / 1000)
-                                
-                                # Extract data from the detail panel
-                                lead = await self.extract_details(page, href)
-                                lead['google_maps_url'] = href
-                                
-                                # Improved Speech Template
-                                if not lead["website_snippet"] or lead["website_snippet"] == "Could not load website.":
-                                    lead["ai_analysis"] = f"¡Hola! Estuve viendo el perfil de {lead['name']} y me encantó el trabajo que realizan. Noté que aún no cuentan con un sitio web oficial, y hoy en día eso es clave para convertir seguidores en clientes.\n\nEn CLAVE.AI ayudamos a negocios a automatizar su crecimiento. Te invito a conocer nuestros servicios en https://claveai.com.mx y ver nuestro trabajo en https://www.instagram.com/claveai/."
-                                else:
-                                    lead["ai_analysis"] = f"¡Hola! Vi la web de {lead['name']} y me pareció excelente. Sin embargo, noté algunas oportunidades para optimizar la conversión con IA.\n\nEn CLAVE.AI nos especializamos en potenciar negocios digitales. Puedes ver lo que hacemos en https://claveai.com.mx y seguirnos en https://www.instagram.com/claveai/."
-
-                                # AI Analysis call (Re-enabling for better personalization)
-                                await asyncio.sleep(1)
-                                try:
-                                    analysis = await ai_analyzer.analyze_business(
-                                        lead["name"], lead["category"], lead["website_snippet"]
-                                    )
-                                    if "Error" not in analysis:
-                                        lead["ai_analysis"] = analysis
-                                except:
-                                    pass # Fallback to hardcoded template if AI fails
-
-                                self.jobs[job_id]["leads"].append(lead)
-                                leads_count += 1
-                                
-                                await status_callback({"type": "lead", "data": lead, "count": leads_count})
-                                
-                                if auto_send_n8n and lead.get("phone"):
-                                    await self.send_to_n8n(lead)
-                                
-                            except Exception as e:
-                                print(f"Error extracting lead: {e}")
+                            if skip_known_places and self.place_index.should_skip(place_id):
                                 continue
+                            
+                            with metrics.lead_timings():
+                                # One time budget for every stage of this lead (see deadline.py)
+                                deadline = LeadDeadline()
+                                try:
+                                    # Click to open details
+                                    with metrics.timed("click"):
+                                        await page.locator(href_selector(href)).first.click(timeout=deadline.timeout_ms(30000))
+                                    with metrics.timed("delay"):
+                                        await session.pace(pacing.delay("maps", delay_min / 1000, delay_max / 1000))
+                                    
+                                    # Extract data from the detail panel
+                                    lead = await self.extract_details(page, href, deadline, text_store)
+                                    lead['google_maps_url'] = href
+                                    await session.snapshot_panel(page, place_id, lead)
+                                    
+                                    # Checkpoint before the slow part of the pipeline (AI), so a crash doesn't redo the browser work
+                                    state["pending"].append(lead)
+                                    checkpoint.save()
+                                    # Not final until emitted (a crash or a batch duplicate leaves it to be revisited)
+                                    self.place_index.record(place_id, "extracted")
+                                    leads_count, emitted = await self._finish_lead(job_id, lead, state, checkpoint, leads_count, status_callback, auto_send_n8n, batch, deadline)
+                                    if emitted:
+                                        self.place_index.record(place_id, "lead")
+                                    
+                                except Exception as e:
+                                    print(f"Error extracting lead: {e}")
+                                    metrics.inc("extract_errors")
+                                    self.place_index.record(place_id, "error")
+                                    warehouse.record("error", {}, source, job_id, place_id=place_id)
+                                    continue
+
+                        # Several scrolls in a row without new places: the feed is exhausted
+                        stale_rounds = stale_rounds + 1 if new_in_round == 0 else 0
+                        if stale_rounds >= 3:
+                            break
 
                         # Scroll to load more
                         await page.mouse.wheel(0, 3000)
-                        await asyncio.sleep(2)
+                        state["scroll_steps"] += 1
+                        checkpoint.save()
+                        await session.wait(pacing.delay("maps", 1.5, 2.5))
                         
                         # Check if we reached the end
                         end_text = await page.locator('text="You\'ve reached the end of the list"').is_visible()
                         if end_text:
                             break
 
+                if auto_send_n8n and self.n8n_webhook_url:
+                    # Give transient webhook failures one last chance before the job ends
+                    await self.drain_n8n_outbox(max_wait_s=30)
+
                 self.jobs[job_id]["status"] = "done"
+                warehouse.record_run(source, time.time() - started, {"seen": len(state["processed_ids"]), "new_leads": leads_count},
+                                     job_id=job_id, query=url)
+                checkpoint.finish()
                 await status_callback({"type": "done", "job_id": job_id})
 
             except Exception as e:
                 self.jobs[job_id]["status"] = "error"
                 self.jobs[job_id]["error"] = str(e)
+                checkpoint.save(status="error")
                 await status_callback({"type": "error", "message": str(e)})
             finally:
-                await browser.close()
+                # Keep the profile's refreshed cookies, then close (closing is what writes a recorded HAR)
+                await profile_manager.checkin(profile, context)
+                await context.close()
+                self.place_index.save()
+                instagram_enricher.save()
+                session.save()
+
+    async def _finish_lead(self, job_id, lead, state, checkpoint, leads_count, status_callback, auto_send_n8n, batch=None, deadline=None):
+        """
+        Rest of the pipeline for an extracted lead (Maps or Instagram): message template, AI analysis, emit, n8n.
+        The AI stage runs on what's left of the lead's budget (a fresh one for resumed/Instagram leads).
+        Returns (leads_count, emitted); emitted is False for a lead dropped as a batch duplicate.
+        """
+        deadline = deadline or LeadDeadline()
+        if batch is not None and not batch.claim(lead):
+            # Another query of the batch already has this business (or the global quota is full)
+            state["pending"].remove(lead)
+            checkpoint.save()
+            metrics.inc("batch_duplicates")
+            warehouse.record("duplicate", lead, "batch", job_id)
+            return leads_count, False
+
+        # Improved Speech Template (Instagram leads come with their own)
+        if lead["ai_analysis"] == "Pending...":
+            if not lead["website_snippet"] or lead["website_snippet"] == "Could not load website.":
+                lead["ai_analysis"] = f"¡Hola! Estuve viendo el perfil de {lead['name']} y me encantó el trabajo que realizan. Noté que aún no cuentan con un sitio web oficial, y hoy en día eso es clave para convertir seguidores en clientes.\n\nEn CLAVE.AI ayudamos a negocios a automatizar su crecimiento. Te invito a conocer nuestros servicios en https://claveai.com.mx y ver nuestro trabajo en https://www.instagram.com/claveai/."
+            else:
+                lead["ai_analysis"] = f"¡Hola! Vi la web de {lead['name']} y me pareció excelente. Sin embargo, noté algunas oportunidades para optimizar la conversión con IA.\n\nEn CLAVE.AI nos especializamos en potenciar negocios digitales. Puedes ver lo que hacemos en https://claveai.com.mx y seguirnos en https://www.instagram.com/claveai/."
+
+        # AI Analysis call (Re-enabling for better personalization)
+        async def analyze():
+            await asyncio.sleep(1)
+            from analyzer import ai_analyzer
+            with metrics.timed("ai"):
+                return await ai_analyzer.analyze_business(
+                    lead["name"], lead["category"], lead["website_snippet"]
+                )
+        try:
+            analysis = await deadline.run("ai", analyze())
+            if analysis and "Error" not in analysis:
+                lead["ai_analysis"] = analysis
+        except Exception:
+            pass # Fallback to hardcoded template if AI fails (or runs out of budget)
+
+        self.jobs[job_id]["leads"].append(lead)
+        state["pending"].remove(lead)
+        state["leads"].append(lead)
+        checkpoint.save()
+        leads_count += 1
+        metrics.inc("leads")
+        warehouse.record("lead", lead, "batch" if batch is not None else "api", job_id)
+        
+        event = {"type": "lead", "data": lead, "count": leads_count, "timings": metrics.current_lead_timings()}
+        if deadline.overrun_stage:
+            # Partial lead: the budget ran out at this stage
+            event["budget_overrun"] = deadline.overrun_stage
+        await status_callback(event)
+        
+        if auto_send_n8n and lead.get("phone"):
+            await self.send_to_n8n(lead)
+        return leads_count, True
 
-    async def extract_details(self, page, url) -> Dict:
+    async def resume(self, job_id: str, status_callback):
+        """Continue a job from its last checkpoint with the parameters it was started with"""
+        checkpoint = JobCheckpoint.load(job_id)
+        if checkpoint is None:
+            await status_callback({"type": "error", "message": "No checkpoint found for this job"})
+            return
+        params = checkpoint.params
+        await self.scrape(
+            job_id, params["url"], params["mode"], params["max_leads"], params["delay_min"], params["delay_max"],
+            params["extract_website"], params["extract_phone"], status_callback,
+            params.get("auto_send_n8n", False), params.get("skip_known_places", False), resume=True
+        )
+
+    async def extract_details(self, page, url, deadline: Optional[LeadDeadline] = None, store: Optional[TextStore] = None) -> Dict:
         # Selectors (Google Maps selectors change often, these are current common ones)
         # Using specific ARIA labels or data attributes is more robust
         
@@ -279,37 +499,59 @@ class GMapsScraper:
         rating_selector = 'div.F7kYV span.ceXN1' # Rating text
         reviews_selector = 'div.F7kYV span.Z4STNb' # Review count
 
+        deadline = deadline or LeadDeadline()
+
         # Wait for the panel to load
-        await page.wait_for_selector(name_selector, timeout=10000)
+        # Its load time (or failure) is the health signal for the adaptive pacing
+        start = time.perf_counter()
+        try:
+            with metrics.timed("panel_wait"):
+                await page.wait_for_selector(name_selector, timeout=deadline.timeout_ms(10000))
+        except Exception:
+            pacing.stress("maps", "empty_panel")
+            raise
+        pacing.success("maps", time.perf_counter() - start)
 
         details = {
-            "name": await self.get_text(page, name_selector),
-            "category": await self.get_text(page, category_selector),
-            "address": await self.get_text(page, address_selector),
-            "phone": await self.get_text(page, phone_selector),
-            "website": await self.get_attr(page, website_selector, "href"),
-            "rating": await self.get_text(page, 'span.rating-score'),
-            "reviews_count": await self.get_text(page, 'button[aria-label*="reviews"]'),
+            "name": "", "category": "", "address": "", "phone": "", "website": "", "rating": "", "reviews_count": "",
             "website_snippet": "",
             "ai_analysis": "Pending..."
         }
+
+        # Fields are filled one by one: if the budget runs out, the ones read so far are kept
+        async def read_panel():
+            details["name"] = await self.get_text(page, name_selector)
+            details["category"] = await self.get_text(page, category_selector)
+            details["address"] = await self.get_text(page, address_selector)
+            details["phone"] = await self.get_text(page, phone_selector)
+            details["website"] = await self.get_attr(page, website_selector, "href")
+            details["rating"] = await self.get_text(page, 'span.rating-score')
+            details["reviews_count"] = await self.get_text(page, 'button[aria-label*="reviews"]')
+
+        with metrics.timed("panel_read"):
+            await deadline.run("panel_read", read_panel())
         
         # New: Extract some text from the website if it exists
-        if details["website"]:
+        async def read_website():
+            # Open a new tab to avoid losing the maps context (closed even when the budget cancels us)
+            site_page = await page.context.new_page()
             try:
-                # Open a new tab to avoid losing the maps context
-                site_page = await page.context.new_page()
                 await site_page.goto(details["website"], wait_until="domcontentloaded", timeout=15000)
                 # Get body text (first 2000 chars)
-                details["website_snippet"] = await site_page.inner_text("body")
-                details["website_snippet"] = details["website_snippet"][:2000]
+                details["website_snippet"] = (await site_page.inner_text("body"))[:2000]
+            except Exception:
+                details["website_snippet"] = "Could not load website."
+            finally:
                 await site_page.close()
-            except:
+
+        if details["website"]:
+            with metrics.timed("website"):
+                await deadline.run("website", read_website())
+            if deadline.overrun_stage == "website":
                 details["website_snippet"] = "Could not load website."
-                try: await site_page.close()
-                except: pass
             
-        return details
+        # Compact record: the website text is deduplicated through the job's text store (see leads.py)
+        return Lead(details, store=store)
         if details["rating"] == "":
             # Try another way for rating
             try:
@@ -324,7 +566,7 @@ class GMapsScraper:
             element = page.locator(selector).first
             if await element.is_visible(timeout=2000):
                 return (await element.inner_text()).strip()
-        except:
+        except Exception:
             return ""
         return ""
 
@@ -333,7 +575,7 @@ class GMapsScraper:
             element = page.locator(selector).first
             if await element.is_visible(timeout=2000):
                 return await element.get_attribute(attr)
-        except:
+        except Exception:
             return ""
         return ""
 
@@ -11,8 +11,6 @@ Runs via GitHub Actions schedule.
 import asyncio
 import os
 import json
-import httpx
-import random
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
@@ -22,12 +20,20 @@ load_dotenv()
 import sys
 sys.path.insert(0, os.path.dirname(__file__))
 from daily_scraper import LeadTracker
+from outbox import CHANNEL_EVOLUTION_FOLLOWUP, DeliveryOutbox, make_idempotency_key
+from http_clients import http_clients
+from metrics import metrics
+from pacing import pacing
 
 # Evolution API Config
 EVOLUTION_URL = os.getenv("EVOLUTION_API_URL", "https://evolutionapi-evolution-api.ckoomq.easypanel.host")
 EVOLUTION_KEY = os.getenv("EVOLUTION_API_KEY", "")
 EVOLUTION_INSTANCE = os.getenv("EVOLUTION_INSTANCE_NAME", "claveai")
 
+# Versión de FOLLOWUP_MESSAGES (forma parte de la llave de idempotencia del outbox)
+FOLLOWUP_TEMPLATE_VERSION = "v2.1"
+OUTBOX_MAX_WAIT_S = float(os.getenv("OUTBOX_MAX_WAIT_S", "120"))
+
 # Mensajes de follow-up por etapa
 FOLLOWUP_MESSAGES = {
     "day_1": """Hola! 👋 Te escribí ayer, ¿pudiste verlo?
@@ -74,15 +80,18 @@ async def send_whatsapp_message(phone: str, message: str) -> bool:
             "text": message
         }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers, timeout=30.0)
-            
-            if response.status_code in [200, 201]:
-                print(f"[EVOLUTION] ✅ Follow-up enviado a {phone}")
-                return True
-            else:
-                print(f"[EVOLUTION] ❌ Error enviando a {phone}: {response.status_code} - {response.text[:200]}")
-                return False
+        with metrics.timed("send"):
+            response = await http_clients.post("evolution", url, json=payload, headers=headers)
+        
+        if response.status_code == 429:
+            pacing.stress("evolution", "http_429")
+        if response.status_code in [200, 201]:
+            pacing.success("evolution")
+            print(f"[EVOLUTION] ✅ Follow-up enviado a {phone}")
+            return True
+        else:
+            print(f"[EVOLUTION] ❌ Error enviando a {phone}: {response.status_code} - {response.text[:200]}")
+            return False
     except Exception as e:
         print(f"[EVOLUTION] Exception enviando a {phone}: {e}")
         return False
@@ -166,18 +175,28 @@ async def send_followups_via_evolution():
         print(f"[STATS] Total contactados: {stats['total_contacted']} | Pendientes: {stats['pending_followups']}")
         return
     
-    print(f"\n[FOLLOWUP] Enviando {len(all_followups)} follow-ups via Evolution API...")
+    print(f"\n[FOLLOWUP] Encolando {len(all_followups)} follow-ups en el outbox...")
     
-    sent_count = 0
+    # Cada follow-up tiene llave teléfono + etapa + versión: nunca se manda dos veces
+    outbox = DeliveryOutbox()
     for followup in all_followups:
-        print(f"  📤 {followup['lead_name']} ({followup['phone']}) - Tipo: {followup['followup_type']}")
-        
-        success = await send_whatsapp_message(followup["phone"], followup["message"])
-        if success:
-            sent_count += 1
-        
+        key = make_idempotency_key(followup["phone"], followup["followup_type"], FOLLOWUP_TEMPLATE_VERSION)
+        if outbox.enqueue(CHANNEL_EVOLUTION_FOLLOWUP, key, followup):
+            print(f"  📤 {followup['lead_name']} ({followup['phone']}) - Tipo: {followup['followup_type']}")
+    
+    async def deliver(followup):
+        return await send_whatsapp_message(followup["phone"], followup["message"])
+    
+    async def pause():
         # Delay entre mensajes para evitar rate limiting
-        await asyncio.sleep(random.randint(2000, 4000) / 1000)
+        await asyncio.sleep(pacing.delay("evolution", 2, 4))
+    
+    try:
+        # Solo follow-ups: los mensajes iniciales pendientes los entrega daily_scraper
+        result = await outbox.drain({CHANNEL_EVOLUTION_FOLLOWUP: deliver}, pause=pause, max_wait_s=OUTBOX_MAX_WAIT_S)
+    finally:
+        outbox.close()
+    sent_count = result["sent"]
     
     # Marcar día 5 como enviados (cierre definitivo)
     phones_day_5 = [lead["phone"] for lead in leads_day_5]
@@ -185,7 +204,7 @@ async def send_followups_via_evolution():
         tracker.mark_followup_sent(phones_day_5)
         print(f"[TRACKER] Marcados {len(phones_day_5)} leads como CERRADOS (follow-up final)")
     
-    print(f"\n[EVOLUTION] ✅ Enviados {sent_count}/{len(all_followups)} follow-ups exitosamente")
+    print(f"\n[EVOLUTION] ✅ Enviados {sent_count} follow-ups exitosamente")
 
 
 async def main():
@@ -197,6 +216,7 @@ async def main():
     print(f"{'='*60}")
     
     await send_followups_via_evolution()
+    await http_clients.aclose()
     
     print(f"\n{'='*60}")
     print(f"✅ Follow-up sender completado")
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Record/replay of scraping sessions.
+
+record: the browser context captures every network response to a HAR file (Playwright
+        record_har_path) and each opened place panel is snapshotted (panel HTML + the
+        lead extracted from it) next to it.
+replay: the context is served from the HAR (route_from_har, unknown requests aborted),
+        pacing delays are skipped and render waits are capped, and every extracted lead
+        is compared against the recorded one.
+
+Lets us profile and regression-test extract_details and the feed loop on real-shaped
+data without touching Google.
+
+Uso:
+    python sessions.py record <nombre> "<url de maps>" [max_leads]
+    python sessions.py replay <nombre> [max_leads]
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+SESSIONS_DIR = os.getenv("SESSIONS_DIR", "sessions")
+# Render waits (after goto/scroll) are capped to this in replay; pacing delays are dropped entirely
+REPLAY_MAX_WAIT_S = float(os.getenv("REPLAY_MAX_WAIT_S", "0.25"))
+# Fields compared between the recorded and the replayed lead
+COMPARED_FIELDS = ("name", "category", "address", "phone", "website")
+# Session names become file names under SESSIONS_DIR (they come from API requests)
+SESSION_NAME_RE = re.compile(r"[\w-]{1,64}")
+
+
+class ScrapeSession:
+    def __init__(self, name: str = None, mode: str = "live"):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown session mode: {mode}")
+        if mode != "live" and not name:
+            raise ValueError(f"A session name is required to {mode}")
+        if name is not None and not SESSION_NAME_RE.fullmatch(name):
+            raise ValueError("Invalid session name (letters, digits, _ and -, up to 64 characters)")
+        self.name = name
+        self.mode = mode
+        sessions_dir = os.path.realpath(os.path.join(os.path.dirname(__file__), SESSIONS_DIR))
+        base = os.path.realpath(os.path.join(sessions_dir, name or "live"))
+        if os.path.dirname(base) != sessions_dir:
+            raise ValueError("Invalid session name")
+        self.har_path = base + ".har"
+        self.panels_path = base + ".panels.json"
+        self.url = None  # start URL of the recorded session
+        self.panels = {}  # place_id -> {"html": panel HTML, "lead": extracted fields}
+        self.checked = 0
+        self.mismatches = []
+        if mode == "record":
+            os.makedirs(os.path.dirname(self.har_path), exist_ok=True)
+        elif mode == "replay":
+            if not os.path.exists(self.har_path):
+                raise FileNotFoundError(f"No recorded session at {self.har_path}")
+            if os.path.exists(self.panels_path):
+                with open(self.panels_path, "r", encoding="utf-8") as f:
+                    recorded = json.load(f)
+                self.url = recorded.get("url")
+                self.panels = recorded.get("panels", {})
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @property
+    def uses_har(self) -> bool:
+        """record/replay: every request has to go through the browser context to reach the HAR"""
+        return self.mode != "live"
+
+    async def new_context(self, browser, **kwargs):
+        """browser.new_context() recording to / served from this session's HAR"""
+        if self.mode == "record":
+            kwargs.update(record_har_path=self.har_path, record_har_content="embed")
+        context = await browser.new_context(**kwargs)
+        if self.mode == "replay":
+            await context.route_from_har(self.har_path, not_found="abort")
+        return context
+
+    async def wait(self, seconds: float):
+        """Render wait (page load, feed scroll): capped in replay, where the network is instant"""
+        await asyncio.sleep(min(seconds, REPLAY_MAX_WAIT_S) if self.replaying else seconds)
+
+    async def pace(self, seconds: float):
+        """Human-like pacing delay: skipped in replay"""
+        if not self.replaying:
+            await asyncio.sleep(seconds)
+
+    async def snapshot_panel(self, page, place_id: str, lead: dict):
+        if self.mode == "record":
+            try:
+                html = await page.locator('div[role="main"]').first.inner_html(timeout=2000)
+            except Exception:
+                html = ""
+            self.panels[place_id] = {"html": html, "lead": {k: lead.get(k, "") for k in COMPARED_FIELDS}}
+        elif self.mode == "replay" and place_id in self.panels:
+            self.checked += 1
+            recorded = self.panels[place_id]["lead"]
+            diff = {k: (recorded.get(k, ""), lead.get(k, "")) for k in COMPARED_FIELDS if recorded.get(k, "") != lead.get(k, "")}
+            if diff:
+                self.mismatches.append({"place_id": place_id, "diff": diff})
+                print(f"[REPLAY] ❌ {place_id}: {diff}")
+
+    def save(self):
+        if self.mode == "record":
+            with open(self.panels_path, "w", encoding="utf-8") as f:
+                json.dump({"url": self.url, "panels": self.panels}, f, ensure_ascii=False)
+            print(f"[SESSION] Recorded {len(self.panels)} panels -> {self.har_path}")
+        elif self.mode == "replay":
+            print(f"[SESSION] Replay checked {self.checked}/{len(self.panels)} recorded panels, {len(self.mismatches)} mismatches")
+
+
+LIVE = ScrapeSession()
+
+
+async def main():
+    args = sys.argv[1:]
+    if len(args) < 2 or args[0] not in ("record", "replay") or (args[0] == "record" and len(args) < 3):
+        print(__doc__)
+        return 1
+
+    from playwright.async_api import async_playwright
+    from daily_scraper import AutomatedScraper, LeadTracker
+    from place_index import PlaceIndex
+    from warehouse import warehouse
+
+    # Sesiones grabadas/reproducidas no son scraping real: fuera del warehouse analítico
+    warehouse.enabled = False
+    mode, name = args[0], args[1]
+    rest = args[2:]
+    session = ScrapeSession(name, mode)
+    if mode == "record":
+        session.url = rest.pop(0)
+    elif not session.url:
+        print(f"[SESSION] {session.panels_path} has no start URL; record the session again")
+        return 1
+
+    # Estado aislado: sin historial de contactados ni índice de lugares, sin verificar WhatsApp
+    workdir = tempfile.mkdtemp(prefix="session_")
+    scraper = AutomatedScraper(tracker=LeadTracker(os.path.join(workdir, "contacted_leads.json")),
+                               place_index=PlaceIndex(os.path.join(workdir, "place_index.json")))
+    scraper.evolution_key = ""
+    scraper.max_leads = int(rest[0]) if rest else scraper.max_leads
+
+    start = time.perf_counter()
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            leads = await scraper.scrape_in_browser(browser, session.url, session=session)
+        finally:
+            await browser.close()
+    elapsed = time.perf_counter() - start
+
+    session.save()
+    print(f"[SESSION] {mode}: {len(leads)} leads en {elapsed:.1f}s")
+    return 1 if session.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
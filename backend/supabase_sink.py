@@ -0,0 +1,119 @@
+"""
+Buffered Supabase sink for CLAVE.AI
+Acumula filas de contactos y las manda en un solo upsert masivo cuando se
+llena el buffer, cuando pasa el intervalo de flush, o al cerrar el sink.
+El cliente de Supabase es síncrono, así que cada upsert corre en un thread
+y nunca bloquea el event loop del envío de mensajes.
+"""
+
+import asyncio
+import os
+import threading
+
+SINK_BATCH_SIZE = int(os.getenv("SUPABASE_BATCH_SIZE", "50"))
+SINK_FLUSH_INTERVAL_S = float(os.getenv("SUPABASE_FLUSH_INTERVAL_S", "10"))
+SINK_MAX_RETRIES = int(os.getenv("SUPABASE_MAX_RETRIES", "3"))
+
+# Un cliente por (url, key) para todo el proceso: supabase se importa y el cliente se
+# construye en el primer flush, no por cada AutomatedScraper (uno por zona intentada)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str, key: str):
+    with _clients_lock:
+        if (url, key) not in _clients:
+            from supabase import create_client
+            _clients[(url, key)] = create_client(url, key)
+            print("[SUPABASE] Lead tagging system initialized")
+        return _clients[(url, key)]
+
+
+class SupabaseSink:
+    """
+    Sink asíncrono con buffer. Las filas se deduplican por `id` dentro del
+    buffer (Postgres no permite que un upsert toque la misma fila dos veces).
+    """
+
+    def __init__(self, url: str, key: str, table: str = "contacts",
+                 batch_size: int = SINK_BATCH_SIZE, flush_interval_s: float = SINK_FLUSH_INTERVAL_S,
+                 max_retries: int = SINK_MAX_RETRIES):
+        self.url = url
+        self.key = key
+        self.table = table
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_retries = max_retries
+        self._client = None
+        self._buffer = {}
+        self._flush_lock = None
+        self._timer_task = None
+        self._pending_flushes = set()
+        self.stats = {"rows_sent": 0, "batches_sent": 0, "batches_failed": 0}
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = get_client(self.url, self.key)
+        return self._client
+
+    def _upsert_batch(self, rows):
+        """Corre en un thread: un solo round trip para todo el batch"""
+        self._get_client().table(self.table).upsert(rows).execute()
+
+    def add(self, row: dict):
+        """Agrega una fila al buffer. Nunca bloquea: el flush corre en segundo plano."""
+        self._buffer[row["id"]] = row
+        if self._timer_task is None:
+            self._timer_task = asyncio.ensure_future(self._flush_periodically())
+        if len(self._buffer) >= self.batch_size:
+            task = asyncio.ensure_future(self.flush())
+            self._pending_flushes.add(task)
+            task.add_done_callback(self._pending_flushes.discard)
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            if self._buffer:
+                await self.flush()
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            rows = list(self._buffer.values())
+            self._buffer = {}
+
+            loop = asyncio.get_running_loop()
+            for attempt in range(self.max_retries):
+                try:
+                    await loop.run_in_executor(None, self._upsert_batch, rows)
+                    self.stats["rows_sent"] += len(rows)
+                    self.stats["batches_sent"] += 1
+                    print(f"[SUPABASE] ✅ Upsert masivo de {len(rows)} contactos")
+                    return
+                except Exception as e:
+                    print(f"[SUPABASE] ⚠️ Error en batch de {len(rows)} (intento {attempt + 1}/{self.max_retries}): {e}")
+                    if attempt < self.max_retries - 1:
+                        await asyncio.sleep(2 ** attempt)
+
+            # Devolver las filas al buffer para el siguiente flush (sin pisar versiones más nuevas)
+            self.stats["batches_failed"] += 1
+            for row in rows:
+                self._buffer.setdefault(row["id"], row)
+
+    async def close(self):
+        """Flush final al terminar la corrida"""
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            try:
+                await self._timer_task
+            except asyncio.CancelledError:
+                pass
+            self._timer_task = None
+        if self._pending_flushes:
+            await asyncio.gather(*self._pending_flushes, return_exceptions=True)
+        await self.flush()
+        if self._buffer:
+            print(f"[SUPABASE] ❌ {len(self._buffer)} contactos no se pudieron registrar")
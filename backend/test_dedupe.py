@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""Test the fuzzy business deduper on same-name businesses at different places"""
+from dedupe import BusinessDeduper, make_record
+
+MAPS = "https://www.google.com/maps/place/x/data=!4m7!3m6!1s0x0:0x0!8m2!3d{lat}!4d{lng}"
+
+
+def deduper_with(phone, record):
+    deduper = BusinessDeduper()
+    deduper.add(phone, record)
+    return deduper
+
+
+def test_same_name_other_city():
+    # Mismo nombre sin stopwords, otro teléfono y ~13 km de distancia: negocios distintos
+    a = make_record("Clínica Dental Sonrisas", "523311111111", "Av. Patria 1234, Zapopan", MAPS.format(lat=20.71, lng=-103.41))
+    b = make_record("Consultorio Dental Sonrisas", "523322222222", "Calle Juárez 56, Tlaquepaque", MAPS.format(lat=20.63, lng=-103.31))
+    assert deduper_with("523311111111", a).find_match(b) is None
+
+    a = make_record("Veterinaria Pet Care", "523333333333", "Av. Vallarta 3000", MAPS.format(lat=20.67, lng=-103.42))
+    b = make_record("Pet Care", "523344444444", "Periférico Sur 800", MAPS.format(lat=20.55, lng=-103.33))
+    assert deduper_with("523333333333", a).find_match(b) is None
+    print("✅ Mismo nombre, otro teléfono y otra ciudad: no es duplicado")
+
+
+def test_same_business_other_phone():
+    # Mismo negocio con fijo vs. celular, mismo lugar: sí es duplicado
+    a = make_record("Clínica Dental Sonrisas", "523311111111", "Av. Patria 1234, Zapopan", MAPS.format(lat=20.71, lng=-103.41))
+    b = make_record("Dental Sonrisas", "523355555555", "Avenida Patria #1234", MAPS.format(lat=20.7101, lng=-103.4101))
+    assert deduper_with("523311111111", a).find_match(b) is not None
+
+    # Sin ubicación de un lado: el nombre casi idéntico basta
+    c = make_record("Sonrisas Clínica Dental", "523366666666")
+    assert deduper_with("523311111111", a).find_match(c) is not None
+    print("✅ Mismo negocio con otro teléfono en el mismo lugar: duplicado")
+
+
+if __name__ == "__main__":
+    test_same_name_other_city()
+    test_same_business_other_phone()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Test the Instagram harvest against fake Google result pages (no browser, no network)"""
+import asyncio
+import urllib.parse
+
+from instagram import InstagramHarvester
+
+# Resultados por query y página; "spa" y "masajes" comparten perfiles
+SERPS = {
+    "spa": [["spa_uno", "spa_dos", "compartido_a", "compartido_b"], ["spa_tres", "compartido_c"]],
+    "masajes": [["masajes_uno", "compartido_a"], ["compartido_b", "masajes_dos", "compartido_c"]],
+}
+# Google sigue paginando los mismos perfiles sin fin
+REPEATING = ["repetido_uno", "repetido_dos"]
+opened_pages = []
+
+
+class FakePage:
+    def __init__(self):
+        self.links = []
+
+    async def goto(self, url, **kwargs):
+        params = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        query = params["q"][0].replace("site:instagram.com ", "")
+        page = int(params["start"][0]) // 10
+        opened_pages.append((query, page))
+        if query == "repetido":
+            usernames, self.has_next = REPEATING, True
+        else:
+            pages = SERPS[query]
+            usernames, self.has_next = (pages[page] if page < len(pages) else []), page < len(pages) - 1
+        # Pestañas, búsquedas relacionadas y paginación de Google también mencionan instagram.com
+        google = urllib.parse.quote(f"site:instagram.com {query}")
+        self.links = [{"href": f"https://www.google.com/search?q={google}&tbm=isch", "title": "Imágenes"},
+                      {"href": f"https://www.google.com/search?q={google}&start={(page + 1) * 10}", "title": "Siguiente"}]
+        self.links += [{"href": f"https://www.instagram.com/{u}/", "title": u} for u in usernames]
+
+    async def evaluate(self, script, arg=None):
+        return {"links": self.links, "has_next": self.has_next}
+
+    async def content(self):
+        return "<html></html>"
+
+    async def close(self):
+        pass
+
+
+class FakeContext:
+    async def new_page(self):
+        return FakePage()
+
+
+async def harvest(query, seen):
+    harvester = InstagramHarvester(FakeContext(), query, seen, parallel_pages=1)
+    usernames = []
+    while not harvester.done:
+        usernames += [found["username"] for found in await harvester.next_batch(10, on_captcha=None)]
+    return usernames
+
+
+async def test_batch_dedupe():
+    # Dos sub-jobs de un /scrape/batch con el mismo set compartido
+    seen = set()
+    spa, masajes = await asyncio.gather(harvest("spa", seen), harvest("masajes", seen))
+    emitted = spa + masajes
+    print(f"spa: {spa}\nmasajes: {masajes}")
+    assert len(emitted) == len(set(emitted)), emitted
+    assert set(emitted) == {u for pages in SERPS.values() for page in pages for u in page}
+    assert seen == set(emitted)
+    print("\n✅ Cada username se emitió una sola vez entre los dos sub-jobs")
+
+
+async def test_exhaustion():
+    opened_pages.clear()
+    spa = await harvest("spa", set())
+    # Sin "Siguiente" en la 2a página: no se abre una 3a aunque haya links de Google
+    assert opened_pages == [("spa", 0), ("spa", 1)], opened_pages
+    assert len(spa) == 6, spa
+
+    opened_pages.clear()
+    repeated = await harvest("repetido", set())
+    # 1 página con perfiles nuevos + INSTAGRAM_MAX_STALE_BATCHES sin ninguno
+    assert repeated == REPEATING, repeated
+    assert len(opened_pages) == 3, opened_pages
+    print("✅ La cosecha termina sin 'Siguiente' o tras lotes sin usernames nuevos")
+
+
+if __name__ == "__main__":
+    asyncio.run(test_batch_dedupe())
+    asyncio.run(test_exhaustion())
@@ -0,0 +1,101 @@
+"""
+Opt-in timeline tracer for a single scrape job.
+
+While a JobTracer is active (per asyncio task, via a context variable), every
+`metrics.timed` stage and every pooled HTTP request is recorded as a span. The
+result is Chrome Trace Event JSON: open it in https://ui.perfetto.dev or
+chrome://tracing to see navigations, clicks, delays, website tabs and AI calls
+laid out in time, one row per asyncio task.
+"""
+
+import asyncio
+import contextvars
+import json
+import os
+import time
+from contextlib import contextmanager
+
+TRACE_DIR = os.getenv("TRACE_DIR", "traces")
+
+_current_tracer = contextvars.ContextVar("current_tracer", default=None)
+
+
+def current_tracer():
+    return _current_tracer.get()
+
+
+class JobTracer:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.path = trace_path(job_id)
+        self.origin = time.perf_counter()
+        self.events = []
+        self._tids = {}  # asyncio task -> row in the viewer
+
+    def _tid(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task)
+        if key not in self._tids:
+            self._tids[key] = len(self._tids) + 1
+            name = task.get_name() if task is not None else "main"
+            self.events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": self._tids[key], "args": {"name": name}})
+        return self._tids[key]
+
+    def _us(self, perf_time: float) -> float:
+        return round((perf_time - self.origin) * 1_000_000, 1)
+
+    def add_span(self, name: str, start: float, seconds: float, args: dict = None):
+        """Complete event for something that started at perf_counter() `start` and took `seconds`"""
+        event = {"name": name, "ph": "X", "ts": self._us(start), "dur": round(seconds * 1_000_000, 1),
+                 "pid": 1, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def instant(self, name: str, args: dict = None):
+        event = {"name": name, "ph": "i", "s": "t", "ts": self._us(time.perf_counter()), "pid": 1, "tid": self._tid()}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    @contextmanager
+    def activate(self):
+        """Trace everything run in this task (and tasks it creates) until exit"""
+        token = _current_tracer.set(self)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.add_span("job", start, time.perf_counter() - start, {"job_id": self.job_id})
+            _current_tracer.reset(token)
+
+    def save(self) -> str:
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+            print(f"[TRACE] {len(self.events)} events -> {self.path}")
+        except Exception as e:
+            print(f"[TRACE] Error saving trace for {self.job_id}: {e}")
+        return self.path
+
+
+def trace_path(job_id: str) -> str:
+    return os.path.join(os.path.dirname(__file__), TRACE_DIR, f"{job_id}.json")
+
+
+@contextmanager
+def span(name: str, **args):
+    """Records a span if a tracer is active; a no-op otherwise"""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add_span(name, start, time.perf_counter() - start, args)
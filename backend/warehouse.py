@@ -0,0 +1,240 @@
+"""
+Local analytical store of every scraped lead and its pipeline outcome, across jobs.
+
+Scrapers only call record()/record_run(), which append to an in-memory buffer; a
+background task writes the rows in batches from a thread, so the hot path never waits
+on disk. Rows go to DuckDB (columnar, fast aggregates over months of history) when it's
+installed, else to SQLite from the standard library. Prebuilt aggregates are served
+by main.py at /analytics, and printed by `python warehouse.py [aggregate] [days]`.
+
+Each host keeps its own file: the API's holds API jobs only. The daily GitHub Actions
+run carries its warehouse between runs in the Actions cache and uploads it as the
+"warehouse" artifact (with the niche/zone yield in the run summary); download it, or
+point WAREHOUSE_FILE at a shared path, to analyze both together.
+
+Tables:
+- lead_events: one row per place handled (outcome: lead, no_phone, no_whatsapp,
+  duplicate, error, ...), with nicho/zona and the basic lead fields
+- job_runs: one row per scrape run (API job or campaign target) with its duration and
+  outcome counts, for per-minute rates
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+# duckdb is imported on the first connection (it's heavy and most imports of this module never flush)
+HAS_DUCKDB = importlib.util.find_spec("duckdb") is not None
+
+WAREHOUSE_FILE = os.getenv("WAREHOUSE_FILE", "warehouse.duckdb" if HAS_DUCKDB else "warehouse.sqlite")
+WAREHOUSE_BATCH_SIZE = int(os.getenv("WAREHOUSE_BATCH_SIZE", "200"))
+WAREHOUSE_FLUSH_INTERVAL_S = float(os.getenv("WAREHOUSE_FLUSH_INTERVAL_S", "15"))
+# The API and the daily CLI may both write: connections are short-lived and retried if the file is locked
+WAREHOUSE_LOCK_RETRIES = 5
+
+LEAD_COLUMNS = ("ts", "source", "job_id", "nicho", "zona", "place_id", "name", "category", "phone", "has_website", "rating", "outcome")
+RUN_COLUMNS = ("ts", "source", "job_id", "nicho", "zona", "query", "seconds", "seen", "leads", "no_phone", "no_whatsapp", "duplicates")
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS lead_events (
+        ts VARCHAR, source VARCHAR, job_id VARCHAR, nicho VARCHAR, zona VARCHAR, place_id VARCHAR,
+        name VARCHAR, category VARCHAR, phone VARCHAR, has_website BOOLEAN, rating DOUBLE, outcome VARCHAR)""",
+    """CREATE TABLE IF NOT EXISTS job_runs (
+        ts VARCHAR, source VARCHAR, job_id VARCHAR, nicho VARCHAR, zona VARCHAR, query VARCHAR,
+        seconds DOUBLE, seen INTEGER, leads INTEGER, no_phone INTEGER, no_whatsapp INTEGER, duplicates INTEGER)""",
+]
+
+# name -> (description, SQL with one "?" for the ts cutoff). Portable between DuckDB and SQLite.
+AGGREGATES = {
+    "niche_zone_yield": (
+        "WhatsApp-reachable leads per minute of scraping, by niche and zone",
+        """SELECT nicho, zona, COUNT(*) AS runs, SUM(seen) AS places_seen, SUM(leads) AS leads,
+                  ROUND(SUM(seconds) / 60.0, 1) AS minutes,
+                  ROUND(SUM(leads) * 60.0 / NULLIF(SUM(seconds), 0), 3) AS leads_per_minute
+           FROM job_runs WHERE ts >= ?
+           GROUP BY nicho, zona ORDER BY leads_per_minute DESC NULLS LAST""",
+    ),
+    "outcomes_by_day": (
+        "Places handled per day and pipeline outcome",
+        """SELECT substr(ts, 1, 10) AS day, outcome, COUNT(*) AS places
+           FROM lead_events WHERE ts >= ?
+           GROUP BY day, outcome ORDER BY day, outcome""",
+    ),
+    "categories": (
+        "Lead conversion and phone/website coverage by business category",
+        """SELECT category, COUNT(*) AS places,
+                  SUM(CASE WHEN outcome = 'lead' THEN 1 ELSE 0 END) AS leads,
+                  ROUND(AVG(CASE WHEN phone <> '' THEN 1.0 ELSE 0.0 END), 3) AS phone_rate,
+                  ROUND(AVG(CASE WHEN has_website THEN 1.0 ELSE 0.0 END), 3) AS website_rate,
+                  ROUND(AVG(rating), 2) AS avg_rating
+           FROM lead_events WHERE ts >= ?
+           GROUP BY category ORDER BY leads DESC, places DESC LIMIT 100""",
+    ),
+    "niche_outcomes": (
+        "Outcome breakdown by niche (where leads are lost)",
+        """SELECT nicho, COUNT(*) AS places,
+                  SUM(CASE WHEN outcome = 'lead' THEN 1 ELSE 0 END) AS leads,
+                  SUM(CASE WHEN outcome = 'no_phone' THEN 1 ELSE 0 END) AS no_phone,
+                  SUM(CASE WHEN outcome = 'no_whatsapp' THEN 1 ELSE 0 END) AS no_whatsapp,
+                  SUM(CASE WHEN outcome = 'duplicate' THEN 1 ELSE 0 END) AS duplicates,
+                  SUM(CASE WHEN outcome = 'error' THEN 1 ELSE 0 END) AS errors
+           FROM lead_events WHERE ts >= ?
+           GROUP BY nicho ORDER BY leads DESC""",
+    ),
+}
+
+
+def _rating(value):
+    try:
+        return float(str(value).replace(",", ".").split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+class LeadWarehouse:
+    def __init__(self, path=WAREHOUSE_FILE, batch_size: int = WAREHOUSE_BATCH_SIZE,
+                 flush_interval_s: float = WAREHOUSE_FLUSH_INTERVAL_S):
+        self.path = os.path.join(os.path.dirname(__file__), path)
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.enabled = True
+        self._leads = []
+        self._runs = []
+        self._flush_lock = None
+        self._timer_task = None
+        self._schema_ready = False
+        # DuckDB rejects connections with different configurations to one file within a process:
+        # reads and writes use the same (read-write) kind of connection, one at a time
+        self._db_lock = threading.Lock()
+        self.stats = {"rows_written": 0, "flushes_failed": 0}
+
+    # ------------------------------------------------------------------
+    # Hot path: buffer only
+    # ------------------------------------------------------------------
+    def record(self, outcome: str, lead: dict, source: str, job_id: str = "", nicho: str = "", zona: str = "", place_id: str = ""):
+        if not self.enabled:
+            return
+        self._leads.append((
+            datetime.now().isoformat(timespec="seconds"), source, job_id, nicho, zona, place_id,
+            lead.get("name", ""), lead.get("category", ""), lead.get("phone", ""),
+            bool(lead.get("website")), _rating(lead.get("rating")), outcome,
+        ))
+        self._schedule()
+
+    def record_run(self, source: str, seconds: float, outcomes: dict, job_id: str = "", nicho: str = "", zona: str = "", query: str = ""):
+        if not self.enabled:
+            return
+        self._runs.append((
+            datetime.now().isoformat(timespec="seconds"), source, job_id, nicho, zona, query, seconds,
+            outcomes.get("seen", 0), outcomes.get("new_leads", 0), outcomes.get("no_phone", 0),
+            outcomes.get("no_whatsapp", 0), outcomes.get("duplicates", 0),
+        ))
+        self._schedule()
+
+    def _schedule(self):
+        if self._timer_task is None or self._timer_task.done():
+            self._timer_task = asyncio.ensure_future(self._flush_periodically())
+        if len(self._leads) + len(self._runs) >= self.batch_size:
+            asyncio.ensure_future(self.flush())
+
+    async def _flush_periodically(self):
+        while self._leads or self._runs:
+            await asyncio.sleep(self.flush_interval_s)
+            await self.flush()
+
+    # ------------------------------------------------------------------
+    # Writer (runs in a thread)
+    # ------------------------------------------------------------------
+    def _connect(self):
+        for attempt in range(WAREHOUSE_LOCK_RETRIES):
+            try:
+                if HAS_DUCKDB:
+                    import duckdb
+                    return duckdb.connect(self.path)
+                return sqlite3.connect(self.path, timeout=10)
+            except Exception:
+                # Another process (API / daily CLI) holds the DuckDB file: wait for its flush
+                if attempt == WAREHOUSE_LOCK_RETRIES - 1:
+                    raise
+                time.sleep(0.2 * (attempt + 1))
+
+    def _write(self, leads: list, runs: list):
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                if not self._schema_ready:
+                    for statement in SCHEMA:
+                        conn.execute(statement)
+                    self._schema_ready = True
+                if leads:
+                    conn.executemany(f"INSERT INTO lead_events VALUES ({', '.join('?' * len(LEAD_COLUMNS))})", leads)
+                if runs:
+                    conn.executemany(f"INSERT INTO job_runs VALUES ({', '.join('?' * len(RUN_COLUMNS))})", runs)
+                conn.commit()
+            finally:
+                conn.close()
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._leads and not self._runs:
+                return
+            leads, runs = self._leads, self._runs
+            self._leads, self._runs = [], []
+            try:
+                await asyncio.to_thread(self._write, leads, runs)
+                self.stats["rows_written"] += len(leads) + len(runs)
+            except Exception as e:
+                # Back in the buffer for the next flush
+                self._leads = leads + self._leads
+                self._runs = runs + self._runs
+                self.stats["flushes_failed"] += 1
+                print(f"[WAREHOUSE] Flush failed ({len(leads) + len(runs)} rows kept): {e}")
+
+    async def close(self):
+        if self._timer_task is not None:
+            self._timer_task.cancel()
+            self._timer_task = None
+        await self.flush()
+
+    # ------------------------------------------------------------------
+    # Analytics
+    # ------------------------------------------------------------------
+    def _query(self, sql: str, params: tuple) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with self._db_lock:
+            conn = self._connect()
+            try:
+                cursor = conn.execute(sql, params)
+                columns = [d[0] for d in cursor.description]
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                conn.close()
+
+    async def aggregate(self, name: str, days: int = 90) -> list:
+        """Rows of a prebuilt aggregate over the last `days` days (KeyError for unknown names)"""
+        _, sql = AGGREGATES[name]
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat(timespec="seconds")
+        # Unflushed rows count too
+        await self.flush()
+        return await asyncio.to_thread(self._query, sql, (cutoff,))
+
+
+warehouse = LeadWarehouse()
+
+
+if __name__ == "__main__":
+    name = sys.argv[1] if len(sys.argv) > 1 else "niche_zone_yield"
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 90
+    if name not in AGGREGATES:
+        print(f"Unknown aggregate {name!r}; available: {', '.join(AGGREGATES)}")
+        sys.exit(1)
+    print(json.dumps(asyncio.run(warehouse.aggregate(name, days)), indent=2, ensure_ascii=False, default=str))
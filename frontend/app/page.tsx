@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useRef } from "react";
+import { useState, useRef, type MouseEvent } from "react";
 
 interface Lead {
   name: string;
@@ -25,6 +25,7 @@ export default function Home() {
   const [mode, setMode] = useState<"maps" | "instagram">("maps");
   const [autoSendN8n, setAutoSendN8n] = useState(false);
   const [jobId, setJobId] = useState<string | null>(null);
+  const [captchaView, setCaptchaView] = useState(false);
   const eventSourceRef = useRef<EventSource | null>(null);
 
   const startScrape = async () => {
@@ -67,6 +68,10 @@ export default function Home() {
 
       if (data.type === "status") {
         setStatus(data.message);
+      } else if (data.type === "captcha") {
+        // Headless job blocked by Google: show the remote view until it's solved
+        setStatus(data.message);
+        setCaptchaView(data.state === "open" && data.remote_view);
       } else if (data.type === "lead") {
         setLeads((prev) => [...prev, data.data]);
         setStatus(`Extracted ${data.count} leads...`);
@@ -86,6 +91,20 @@ export default function Home() {
     };
   };
 
+  const clickCaptcha = (e: MouseEvent<HTMLImageElement>) => {
+    if (!jobId) return;
+    const img = e.currentTarget;
+    const rect = img.getBoundingClientRect();
+    fetch(`http://localhost:8001/scrape/captcha/${jobId}/click`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({
+        x: ((e.clientX - rect.left) * img.naturalWidth) / rect.width,
+        y: ((e.clientY - rect.top) * img.naturalHeight) / rect.height,
+      }),
+    });
+  };
+
   const downloadCSV = () => {
     if (jobId) {
       window.open(`http://localhost:8001/scrape/result/${jobId}.csv`);
@@ -221,6 +240,19 @@ export default function Home() {
           </div>
         </section>
 
+        {captchaView && jobId && (
+          <section className="bg-slate-800 rounded-2xl shadow-xl border border-amber-500 p-4 mb-8">
+            <p className="text-sm text-amber-400 mb-3">⚠️ Google is asking for a CAPTCHA. Click on the view below to solve it.</p>
+            {/* eslint-disable-next-line @next/next/no-img-element */}
+            <img
+              src={`http://localhost:8001/scrape/captcha/${jobId}/stream`}
+              alt="Remote browser view"
+              onClick={clickCaptcha}
+              className="w-full rounded-lg cursor-crosshair"
+            />
+          </section>
+        )}
+
         <section className="bg-slate-800 rounded-2xl shadow-xl border border-slate-700 overflow-hidden">
           <div className="overflow-x-auto max-h-[600px]">
             <table className="w-full text-left border-collapse">